@@ -1,10 +1,17 @@
 
+import time
+# Taken before the Qt imports, so --startup-time also counts the time spent importing
+_start_time = time.perf_counter()
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtSvg import *
 from PyQt5.QtWidgets import *
 import sys
-from card_lib import *
+import math
+import weakref
+from collections import OrderedDict
+from card_lib import Hand, Board
+from holdem_engine import TexasHoldEngine
 
 # NOTE: This is just given as an example of how to use CardView.
 # It is expected that you will need to adjust things to make a game out of it. 
@@ -19,34 +26,170 @@ class TableScene(QGraphicsScene):
         self.setBackgroundBrush(QBrush(self.tile))
 
 
-class CardItem(QGraphicsSvgItem):
-    """ A simple overloaded QGraphicsSvgItem that also stores the card position """
-    def __init__(self, renderer, position):
+class CardRenderers:
+    """ The SVG renderers of the 52 cards and the back, keyed by (value, suit) or 'back', read on first use """
+
+    def __init__(self):
+        self.files = dict() # Dictionaries let us have convenient mappings between cards and their images
+        for suit_file, suit in zip('CDSH', range(4)): # Check the order of the suits here!!!
+            for value_file, value in zip(['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A'], range(2, 15)):
+                key = (value, suit)  # I'm choosing this tuple to be the key for this dictionary
+                self.files[key] = 'cards/' + value_file + suit_file + '.svg'
+        self.files['back'] = 'cards/Red_Back_2.svg'
+        self.renderers = dict()
+
+    def __getitem__(self, key):
+        if key not in self.renderers:
+            self.renderers[key] = QSvgRenderer(self.files[key])
+        return self.renderers[key]
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+
+class CardAtlas:
+    """ The card faces and the back rasterized at one scale, each with its drop shadow baked in """
+
+    def __init__(self, renderers, scale):
+        """
+        :param renderers: The CardRenderers, one per card key.
+        :param scale: The scale the cards are rasterized at, 1.0 being the size of the SVG files.
+        """
+        self.renderers = renderers
+        self.scale = scale
+        size = renderers['back'].defaultSize()
+        self.card_width = math.ceil(size.width()*scale)
+        self.card_height = math.ceil(size.height()*scale)
+        # Room around the card for the blurred and offset shadow
+        self.margin = math.ceil(15*scale)
+        self.cell_width = self.card_width + self.margin
+        self.cell_height = self.card_height + self.margin
+        # Cards are rasterized and allocated the first time they are shown, so a new scale only costs the visible
+        # cards
+        self.pixmaps = dict()
+        # The views drawing with this atlas, which the cache must not evict
+        self.views = weakref.WeakSet()
+
+    def nbytes(self):
+        return len(self.pixmaps)*self.cell_width*self.cell_height*4
+
+    def pixmap(self, key):
+        """
+        :param key: The key of the card, (value, suit) or 'back'.
+        :return: The pixmap of the card with its shadow.
+        """
+        if key not in self.pixmaps:
+            self.pixmaps[key] = self.render_card(key)
+        return self.pixmaps[key]
+
+    def render_card(self, key):
+        card = QImage(self.card_width, self.card_height, QImage.Format_ARGB32_Premultiplied)
+        card.fill(Qt.transparent)
+        painter = QPainter(card)
+        self.renderers[key].render(painter, QRectF(0, 0, self.card_width, self.card_height))
+        painter.end()
+
+        # Let a throwaway scene apply the same shadow effect the cards used to have, once
+        scene = QGraphicsScene()
+        item = scene.addPixmap(QPixmap.fromImage(card))
+        shadow = QGraphicsDropShadowEffect()
+        shadow.setBlurRadius(10.*self.scale)
+        shadow.setOffset(5*self.scale, 5*self.scale)
+        shadow.setColor(QColor(0, 0, 0, 180)) # Semi-transparent black!
+        item.setGraphicsEffect(shadow)
+        pixmap = QPixmap(self.cell_width, self.cell_height)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        rect = QRectF(0, 0, self.cell_width, self.cell_height)
+        scene.render(painter, rect, rect)
+        painter.end()
+        return pixmap
+
+
+class CardPixmapCache:
+    """ Keeps the CardAtlas of the scales in use and of the most recently used ones, within a memory budget """
+
+    def __init__(self, max_bytes=64 << 20, steps_per_octave=8):
+        """
+        :param max_bytes: The memory the atlases may use. Atlases that a view draws with are counted, but never
+        evicted, so only unused atlases make room.
+        :param steps_per_octave: Scales are rounded to this many steps per doubling, so resizing a window only
+        creates a new atlas every few percent.
+        """
+        self.max_bytes = max_bytes
+        self.steps_per_octave = steps_per_octave
+        self.atlases = OrderedDict()
+
+    def atlas(self, renderers, scale, view):
+        """
+        :param renderers: The CardRenderers, one per card key.
+        :param scale: The scale the cards are shown at.
+        :param view: The view that draws with the atlas. The atlas it used before is released.
+        :return: A CardAtlas with a scale close to the requested one.
+        """
+        step = round(math.log2(max(scale, 0.01))*self.steps_per_octave)
+        if step not in self.atlases:
+            self.atlases[step] = CardAtlas(renderers, 2**(step/self.steps_per_octave))
+        self.atlases.move_to_end(step)
+        atlas = self.atlases[step]
+        for other in self.atlases.values():
+            other.views.discard(view)
+        atlas.views.add(view)
+        self.evict()
+        return atlas
+
+    def evict(self):
+        """
+        Drops the least recently used atlases that no view draws with, until the atlases fit in the budget.
+        """
+        total = sum(atlas.nbytes() for atlas in self.atlases.values())
+        for step, atlas in list(self.atlases.items()):
+            if total <= self.max_bytes:
+                break
+            if not atlas.views:
+                del self.atlases[step]
+                total -= atlas.nbytes()
+
+
+class CardItem(QGraphicsItem):
+    """ Draws a card from a CardAtlas and stores the card position """
+    def __init__(self, atlas, key, position):
         super().__init__()
-        self.setSharedRenderer(renderer)
+        self.atlas = None
+        self.key = key
+        self.set_atlas(atlas)
         self.position = position
 
+    def set_card(self, key):
+        # Only repaint if the card actually changed
+        if key != self.key:
+            self.key = key
+            self.update()
+
+    def set_atlas(self, atlas):
+        if atlas is not self.atlas:
+            self.prepareGeometryChange()
+            self.atlas = atlas
+            # The atlas is rasterized at the scale of the view, so undo that scale to get one texel per pixel
+            self.setScale(1/atlas.scale)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.atlas.cell_width, self.atlas.cell_height)
+
+    def paint(self, painter, option, widget=None):
+        painter.drawPixmap(QPointF(0, 0), self.atlas.pixmap(self.key))
+
 
 class CardView(QGraphicsView):
     """ A View widget that represents the table area displaying a players cards. """
 
-    # Underscores indicate a private function/method!
-    def __read_cards(): # Ignore the PyCharm warning on this line. It's correct.
-        """
-        Reads all the 52 cards from files.
-        :return: Dictionary of SVG renderers
-        """
-        all_cards = dict() # Dictionaries let us have convenient mappings between cards and their images
-        for suit_file, suit in zip('CDSH', range(4)): # Check the order of the suits here!!!
-            for value_file, value in zip(['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A'], range(2, 15)):
-                file = value_file + suit_file
-                key = (value, suit)  # I'm choosing this tuple to be the key for this dictionary
-                all_cards[key] = QSvgRenderer('cards/' + file + '.svg')
-        return all_cards
-
-    # We read all the card graphics as static class variables
-    back_card = QSvgRenderer('cards/Red_Back_2.svg')
-    all_cards = __read_cards()
+    # The card graphics are shared by all views, and each SVG file is only read when the card is first drawn
+    card_renderers = CardRenderers()
+    # The rasterized cards are shared by all views
+    pixmap_cache = CardPixmapCache()
 
     def __init__(self, cards_model, card_spacing=250, padding=10):
         """
@@ -63,6 +206,13 @@ class CardView(QGraphicsView):
         self.card_spacing = card_spacing
         self.padding = padding
 
+        # The items showing the cards, in position order, and removed items that can be used again
+        self.card_items = []
+        self.spare_card_items = []
+        self.atlas = self.pixmap_cache.atlas(self.card_renderers, self.view_scale(), self)
+        # The atlas scale is rounded, so smooth the little rescaling that is left
+        self.setRenderHint(QPainter.SmoothPixmapTransform)
+
         # Whenever the this window should update, it should call the "change_cards" method.
         # This can, for example, be done by connecting it to a signal.
         # The view can listen to changes:
@@ -74,30 +224,44 @@ class CardView(QGraphicsView):
         self.change_cards()
 
     def change_cards(self):
-        # Add the cards from scratch
-        self.scene.clear()
-        for i, card in enumerate(self.model.cards):
+        # Only touch the cards that were added, removed or flipped, instead of rebuilding the scene
+        cards = self.model.cards
+        for i, card in enumerate(cards):
             # The ID of the card in the dictionary of images is a tuple with (value, suit), both integers
-            # TODO: YOU MUST CORRECT THE EXPRESSION TO MATCH YOUR PLAYING CARDS!!!
-            # TODO: See the __read_cards method for what mapping are used.
-            graphics_key = (card.get_value(), card.get_suit())
-            renderer = self.back_card if self.model.flipped(i) else self.all_cards[graphics_key]
-            c = CardItem(renderer, i)
-            # Shadow effects are cool!
-            shadow = QGraphicsDropShadowEffect(c)
-            shadow.setBlurRadius(10.)
-            shadow.setOffset(5, 5)
-            shadow.setColor(QColor(0, 0, 0, 180)) # Semi-transparent black!
-            c.setGraphicsEffect(shadow)
+            graphics_key = 'back' if self.model.flipped(i) else (card.get_value(), card.get_suit())
+            if i < len(self.card_items):
+                self.card_items[i].set_card(graphics_key)
+                continue
+            if self.spare_card_items:
+                c = self.spare_card_items.pop()
+                c.set_card(graphics_key)
+                c.set_atlas(self.atlas)
+                c.position = i
+            else:
+                c = CardItem(self.atlas, graphics_key, i)
             # Place the cards on the default positions
             c.setPos(c.position * self.card_spacing, 0)
             self.scene.addItem(c)
+            self.card_items.append(c)
+
+        while len(self.card_items) > len(cards):
+            c = self.card_items.pop()
+            self.scene.removeItem(c)
+            self.spare_card_items.append(c)
 
         self.update_view()
 
+    def view_scale(self):
+        return max((self.viewport().height()-2*self.padding)/313, 0.01)
+
     def update_view(self):
-        scale_h = (self.viewport().height()-2*self.padding)/313
+        scale_h = self.view_scale()
         # scale_w = (self.viewport().width()-2*self.padding)/313
+        atlas = self.pixmap_cache.atlas(self.card_renderers, scale_h, self)
+        if atlas is not self.atlas:
+            self.atlas = atlas
+            for c in self.card_items:
+                c.set_atlas(atlas)
         self.resetTransform()
         self.scale(scale_h, scale_h)
         # Put the scene bounding box
@@ -151,16 +315,16 @@ class HandModel(Hand, QObject):
         super().add_card(card)
         self.data_changed.emit()
 
-    def empty_hand(self):
-        super().remove_card(list(range(len(self.cards))))
+    def clear(self):
+        super().clear()
         self.data_changed.emit()
 
 
-class DealerModel(Hand, QObject):
+class DealerModel(Board, QObject):
     data_changed = pyqtSignal()
 
     def __init__(self):
-        Hand.__init__(self)
+        Board.__init__(self)
         QObject.__init__(self)
 
         # Additional state needed by the UI, keeping track of the selected cards:
@@ -184,8 +348,8 @@ class DealerModel(Hand, QObject):
         super().add_card(card)
         self.data_changed.emit()
 
-    def empty_dealer(self):
-        super().remove_card(list(range(len(self.cards))))
+    def clear(self):
+        super().clear()
         self.data_changed.emit()
 
 
@@ -231,155 +395,48 @@ class buttons(QGraphicsView):
         super().resizeEvent(painter)
 
 
-class TexasHold(QObject):
+class TexasHold(TexasHoldEngine, QObject):
+    """ A thin Qt adapter around TexasHoldEngine, which turns the engine's hooks into signals and flips the cards """
     new_total = pyqtSignal()
     winner = pyqtSignal(str, )
 
     def __init__(self, player1="Player 1", player2="Player 2", money1=1000, money2=1000):
-        super().__init__()
-        self.players = [player1, player2]
-        self.money = [money1, money2]
-        self.bet = 0
-        self.pot = 0
-        self.total = self.money + [0]
-        self.which_player = 0
-        self.player2_has_raised = 0
-
-        self.deck = StandardDeck()
-        self.deck.shuffle()
-
-        self.hand1 = HandModel()
+        QObject.__init__(self)
+        TexasHoldEngine.__init__(self, player1, player2, money1, money2)
         self.hand1.flippable = True
-        self.hand2 = HandModel()
         self.hand2.flippable = False
-        self.dealer = DealerModel()
-        self.hand1.add_card(self.deck.take_top())
-        self.hand2.add_card(self.deck.take_top())
-        self.hand1.add_card(self.deck.take_top())
-        self.hand2.add_card(self.deck.take_top())
 
-    def check_call_button(self):
-        if self.which_player == 0:       # if player1 active
-            if self.player2_has_raised == 1:
-                self.player2_has_raised = 0
-                self.total[0] -= self.bet
-                self.pot += self.bet
-                if not self.hand1.flipped(0):
-                    self.hand1.flip()
-                self.hand1.flippable = False
-                self.hand2.flippable = True
-                self.new_deal()
-            else:
-                self.change_player()
-            self.new_total.emit()
-        else:
-            self.total[1] -= self.bet
-            self.pot += self.bet
-            self.new_deal()
+    def new_hand(self):
+        return HandModel()
 
-    def fold_button(self):
-        self.total[not self.which_player] += self.pot
-        self.check_winner_game()
+    def new_board(self):
+        return DealerModel()
+
+    def totals_changed(self):
         self.new_total.emit()
-        self.new_round()
 
-    def raise_button(self):
-        # print("Clicked raise")
-        if self.which_player == 0:
-            self.bet = self.total[2]
-            self.total[0] -= self.bet
-            self.pot += self.bet
-        else:
-            self.bet = self.total[2]-self.bet
-            self.total[1] -= self.total[2]
-            self.pot += self.bet
-            self.player2_has_raised = 1
-        self.change_player()
+    def game_over(self, text):
+        self.winner.emit(text)
 
-    def slider(self, value):
-        # print("SLIDER: ")
-        self.total[2] = value
-        self.new_total.emit()
+    def turn_changed(self):
+        # Hide both hands, only the player to act may look at their cards
+        for i, hand in enumerate([self.hand1, self.hand2]):
+            if not hand.flipped(0):
+                hand.flippable = True
+                hand.flip()
+            hand.flippable = i == self.which_player
 
-    def change_player(self):
-        if not self.which_player:       # if player 1 active
-            if not self.hand1.flipped(0):
-                self.hand1.flip()
-            self.hand1.flippable = False
-            self.hand2.flippable = True
-            self.which_player = 1
-        else:
-            if not self.hand2.flipped(0):
-                self.hand2.flip()
-            self.hand2.flippable = False
-            self.hand1.flippable = True
-            self.which_player = 0
-        self.new_total.emit()
+    def check_call_button(self):
+        self.check_call()
 
-    def new_deal(self):
-        # print("New round!")
-        self.bet = 0
-        if not self.hand2.flipped(0):
-            self.hand2.flip()
-        self.hand1.flippable = True
-        self.hand2.flippable = False
-        if len(self.dealer) == 0:
-            self.deck.take_top()
-            for i in range(3):
-                self.dealer.add_card(self.deck.take_top())
-            self.which_player = 0
-        elif 0 < len(self.dealer) < 5:
-            self.deck.take_top()
-            self.dealer.add_card(self.deck.take_top())
-            self.which_player = 0
-        else:
-            self.winner_round()
-            self.check_winner_game()
-            self.new_round()
-        self.new_total.emit()
+    def fold_button(self):
+        self.fold()
 
-    def new_round(self):
-        if not self.hand1.flipped(0):
-            self.hand1.flippable = True
-            self.hand1.flip()
-        if not self.hand2.flipped(0):
-            self.hand2.flippable = True
-            self.hand2.flip()
-        self.hand2.flippable = False
-        self.pot = 0
-        self.bet = 0
-        self.deck = StandardDeck()
-        self.deck.shuffle()
-        self.which_player = 0
-        self.player2_has_raised = 0
-        self.dealer.empty_dealer()
-        self.hand1.empty_hand()
-        self.hand2.empty_hand()
-        self.hand1.add_card(self.deck.take_top())
-        self.hand2.add_card(self.deck.take_top())
-        self.hand1.add_card(self.deck.take_top())
-        self.hand2.add_card(self.deck.take_top())
-
-    def winner_round(self):
-        best_hand1 = self.hand1.best_poker_hand(self.dealer.cards)
-        best_hand2 = self.hand2.best_poker_hand(self.dealer.cards)
-        # print("I winner_round")
-        if best_hand1 < best_hand2:
-            # print("Hand 2 är bättre än 1")
-            self.total[1] += self.pot
-        elif best_hand2 < best_hand1:
-            # print("Hand 1 är bättre än 2")
-            self.total[0] += self.pot
-        else:
-            self.total[0] += self.pot/2
-            self.total[1] += self.pot/2
-        self.pot = 0
+    def raise_button(self):
+        self.raise_bet()
 
-    def check_winner_game(self):
-        if self.total[0] == 0:
-            self.winner.emit(self.players[1] + " won!")
-        elif self.total[1] == 0:
-            self.winner.emit(self.players[0] + " won!")
+    def slider(self, value):
+        self.set_bet_size(value)
 
 
 class GameView(QWidget):
@@ -531,11 +588,27 @@ class ReadPlayers(QDialog):
 
 
 # Lets test it out
-
-
-app = QApplication(sys.argv)
-players_info = ReadPlayers.get_names_and_cash()
-game = TexasHold(players_info[0], players_info[2], players_info[1], players_info[3])
-view = GameView(game)
-
-app.exec_()
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    if '--startup-time' in sys.argv:
+        # Measures how long it takes to show the first frame, with default players instead of the dialog
+        import_done = time.perf_counter()
+        game = TexasHold()
+        view = GameView(game)
+        build_done = time.perf_counter()
+
+        def report():
+            painted = time.perf_counter()
+            print("imports     {:7.1f} ms".format((import_done - _start_time)*1000))
+            print("build game  {:7.1f} ms".format((build_done - import_done)*1000))
+            print("first paint {:7.1f} ms".format((painted - build_done)*1000))
+            print("total       {:7.1f} ms".format((painted - _start_time)*1000))
+            app.quit()
+        # The timer fires once the event loop has shown and painted the window
+        QTimer.singleShot(0, report)
+    else:
+        players_info = ReadPlayers.get_names_and_cash()
+        game = TexasHold(players_info[0], players_info[2], players_info[1], players_info[3])
+        view = GameView(game)
+
+    app.exec_()
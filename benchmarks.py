@@ -0,0 +1,159 @@
+"""
+Throughput benchmarks for the card_lib evaluator and deck paths.
+
+    python benchmarks.py --output results.json
+    python benchmarks.py --output results.json --compare baseline.json --threshold 0.1
+
+The results are written as JSON. With --compare, every benchmark that got more than --threshold slower than in
+the baseline is listed and the script exits with status 1.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+from card_lib import *
+from holdem_engine import TexasHoldEngine
+
+
+def sample_hands(hand_type, n_cards, count, seed=0):
+    """
+    Deals random hands until count hands of the given type have been found.
+
+    :param hand_type: The PokerHandType the hands should have.
+    :param n_cards: The number of cards in every hand (hole cards plus table cards).
+    :param count: The number of hands to find.
+    :param seed: Seed for the random module, so every run measures the same hands.
+    :return: A list of (Hand, table_cards) pairs.
+    """
+    rng = random.Random(seed)
+    hands = []
+    while len(hands) < count:
+        # Straight flushes and quads are too rare to find by chance, so those hands are built around the made cards
+        if hand_type == PokerHandType.straight_flush:
+            suit, high = rng.randrange(4), rng.randrange(4, 13)
+            made = [suit*13 + rank for rank in range(high - 4, high + 1)]
+        elif hand_type == PokerHandType.four_of_a_kind:
+            rank = rng.randrange(13)
+            made = [suit*13 + rank for suit in range(4)]
+        else:
+            made = []
+        codes = made + rng.sample([code for code in range(52) if code not in made], n_cards - len(made))
+        rng.shuffle(codes)
+        cards = ints_to_cards(codes)
+        if lookup_strength(cards) >> STRENGTH_SHIFT == hand_type:
+            hand = Hand()
+            hand.add_card(cards[0])
+            hand.add_card(cards[1])
+            hands.append((hand, cards[2:]))
+    return hands
+
+
+def measure(function, number, repeat=5):
+    """
+    Times a function with timeit.
+
+    :param function: The function to call, without arguments.
+    :param number: How many times the function is called per timing.
+    :param repeat: How many timings to make. The fastest is kept, as the others are mostly disturbed by noise.
+    :return: The number of calls per second.
+    """
+    best = min(timeit.repeat(function, number=number, repeat=repeat))
+    return number / best
+
+
+def play_round(game):
+    """
+    Plays a round of TexasHoldEngine to showdown with both players checking every street.
+    """
+    while len(game.dealer) < 5:
+        game.check_call()
+        game.check_call()
+    game.check_call()
+    game.check_call()
+
+
+def run_benchmarks(quick=False):
+    """
+    :param quick: Use fewer hands and repetitions, for a fast but noisier run.
+    :return: A dictionary mapping every benchmark name to its throughput in operations per second.
+    """
+    per_sample = 20 if quick else 200
+    repeat = 3 if quick else 5
+    results = {}
+
+    for hand_type in reversed(PokerHandType):
+        for n_cards in (5, 6, 7):
+            hands = sample_hands(hand_type, n_cards, per_sample)
+            for mode in EvaluatorMode:
+                def evaluate():
+                    for hand, table_cards in hands:
+                        hand.best_poker_hand(table_cards, mode)
+                name = "best_poker_hand[{},{},{}]".format(mode.value, hand_type.name, n_cards)
+                results[name] = measure(evaluate, 1, repeat) * len(hands)
+
+    cards = [ints_to_cards(random.Random(i).sample(range(52), 7)) for i in range(per_sample)]
+
+    def bins():
+        for total_cards in cards:
+            create_bins_for_cards(total_cards)
+    results["create_bins_for_cards[7]"] = measure(bins, 1, repeat) * len(cards)
+
+    codes = np.array([cards_to_ints(total_cards) for total_cards in cards])
+    results["evaluate_batch[7]"] = measure(lambda: evaluate_batch(codes), 10, repeat) * len(codes)
+
+    results["StandardDeck()"] = measure(StandardDeck, 1000, repeat)
+
+    deck = StandardDeck()
+
+    def deal():
+        deck.reset()
+        deck.shuffle()
+        for i in range(9):
+            deck.take_top()
+    results["shuffle+take_top[9]"] = measure(deal, 1000, repeat)
+
+    game = TexasHoldEngine(rng=0)
+    results["TexasHoldEngine round"] = measure(lambda: play_round(game), 100 if quick else 1000, repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    :param results: The throughputs of this run.
+    :param baseline: The throughputs of the baseline run.
+    :param threshold: The allowed relative slowdown, for instance 0.1 for 10 %.
+    :return: A list of (name, baseline, current) for every benchmark that got slower than the threshold allows.
+    """
+    regressions = []
+    for name, current in results.items():
+        if name in baseline and current < baseline[name] * (1 - threshold):
+            regressions.append((name, baseline[name], current))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the card_lib evaluator and deck paths.")
+    parser.add_argument('--output', default='benchmark_results.json', help="where to write the results")
+    parser.add_argument('--compare', default=None, help="a previous results file to compare with")
+    parser.add_argument('--threshold', type=float, default=0.1, help="allowed relative slowdown")
+    parser.add_argument('--quick', action='store_true', help="fewer hands and repetitions")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.quick)
+    with open(args.output, 'w') as file:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'time': time.time(),
+                   'results': results}, file, indent=2, sort_keys=True)
+    for name, ops in sorted(results.items()):
+        print("{:50s} {:14.0f} ops/s".format(name, ops))
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print("REGRESSION {}: {:.0f} -> {:.0f} ops/s ({:+.1%})".format(name, before, after, after/before - 1))
+        if regressions:
+            sys.exit(1)
@@ -1,17 +1,50 @@
 from random import shuffle
+from collections import OrderedDict
+import importlib.util
+import sys
+import os
 import enum
-import numpy as np
+import numbers
+import re
 import abc
 
 
+def _lazy_import(name):
+    """
+    Imports a module the first time one of its attributes is used, so importing card_lib stays cheap for programs
+    that never need it.
+
+    :param name: The name of the module.
+    :return: The module, which is loaded on first attribute access.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named '{}'".format(name), name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+np = _lazy_import('numpy')
+
+
 class PlayingCard(metaclass=abc.ABCMeta):
     """
-    This class represents a standard class for all individual cards in a deck.
+    This class represents a standard class for all individual cards in a deck. Every card also carries its
+    integer code (see card_to_int), and the cards in CARDS are shared by all decks and hands.
     """
+    __slots__ = ('suit', 'code')
+
     def __init__(self, suit):
         self.suit = suit
         if not isinstance(suit, Suits):
             raise TypeError
+        self.code = suit.value*13 + self.get_value() - 2
 
     @abc.abstractmethod
     def get_value(self):
@@ -42,11 +75,20 @@ class PlayingCard(metaclass=abc.ABCMeta):
     def __eq__(self, other):
         return self.get_value() == other.get_value() and self.get_suit() == other.get_suit()
 
+    def __hash__(self):
+        return self.code
+
+    def __reduce__(self):
+        # Pickled cards are turned back into the shared instances, also in other processes.
+        return int_to_card, (self.code,)
+
 
 class NumberedCard(PlayingCard):
     """
     Class representing the numbered card in a deck which inherits from the PlayingCard class.
     """
+    __slots__ = ('value',)
+
     def __init__(self, value, suit):
         self.value = value
         super().__init__(suit)
@@ -62,6 +104,8 @@ class JackCard(PlayingCard):
     """
     Class representing the jack card in a deck which inherits from the PlayingCard class.
     """
+    __slots__ = ()
+
     def get_value(self):
         return 11
 
@@ -73,6 +117,8 @@ class QueenCard(PlayingCard):
     """
     Class representing the queen card in a deck which inherits from the PlayingCard class.
     """
+    __slots__ = ()
+
     def get_value(self):
         return 12
 
@@ -84,6 +130,8 @@ class KingCard(PlayingCard):
     """
     Class representing the king card in a deck which inherits from the PlayingCard class.
     """
+    __slots__ = ()
+
     def get_value(self):
         return 13
 
@@ -95,6 +143,8 @@ class AceCard(PlayingCard):
     """
     Class representing the ace card in a deck which inherits from the PlayingCard class.
     """
+    __slots__ = ()
+
     def get_value(self):
         return 14
 
@@ -115,33 +165,128 @@ class Suits(enum.IntEnum):
         return '♣♦♠♥'[self.value]
 
 
-class StandardDeck:
+def _make_card(code):
+    suit = Suits(code // 13)
+    value = code % 13 + 2
+    if value == 11:
+        return JackCard(suit)
+    elif value == 12:
+        return QueenCard(suit)
+    elif value == 13:
+        return KingCard(suit)
+    elif value == 14:
+        return AceCard(suit)
+    return NumberedCard(value, suit)
+
+
+# The card codes of a new StandardDeck, which is ordered suit by suit as Suits is listed.
+NEW_DECK_ORDER = tuple(suit.value*13 + rank for suit in Suits for rank in range(13))
+
+# The 52 cards indexed by their integer code, suit*13 + value-2 (so 0 is the two of clubs and 51 the ace of hearts).
+CARDS = tuple(_make_card(code) for code in range(52))
+
+
+def card_to_int(card):
     """
-    StandardDeck is a class which describes a deck which contains 52 individual cards.
+    :param card: An object of type PlayingCard.
+    :return: The integer code of the card, ranging from 0 to 51.
     """
-    def __init__(self):
-        self.cards = []
+    return card.code
+
+
+def int_to_card(code):
+    """
+    :param code: The integer code of a card, ranging from 0 to 51.
+    :return: The shared PlayingCard with that code.
+    """
+    return CARDS[code]
 
-        for color in Suits:
-            for i in range(2, 11):
 
-                self.cards.append(NumberedCard(i, color))
+def cards_to_ints(cards):
+    """
+    :param cards: A list of PlayingCard's.
+    :return: A list with the integer codes of the cards.
+    """
+    return [card.code for card in cards]
+
+
+def to_codes(cards):
+    """
+    :param cards: A Hand, or a list of PlayingCard's or integer card codes.
+    :return: A list with the integer codes of the cards.
+    """
+    if isinstance(cards, Hand):
+        return cards.codes()
+    return [card.code if isinstance(card, PlayingCard) else int(card) for card in cards]
+
+
+def ints_to_cards(codes):
+    """
+    :param codes: A list of integer card codes.
+    :return: A list with the shared PlayingCard's for the codes.
+    """
+    return [CARDS[code] for code in codes]
 
-            self.cards.append(JackCard(color))
 
-            self.cards.append(QueenCard(color))
+class StandardDeck:
+    """
+    StandardDeck is a class which describes a deck which contains 52 individual cards. The deck keeps the integer
+    codes of the cards in a fixed list together with the position of the top card, so dealing only moves the
+    position and a deck can be reset and reused for the next round.
+    """
+    def __init__(self, rng=None):
+        """
+        :param rng: The random generator used by shuffle: a numpy.random.Generator, or anything that
+        numpy.random.default_rng accepts such as an int seed or a SeedSequence. None uses the random module.
+        """
+        self.order = list(NEW_DECK_ORDER)
+        self.top = 0
+        self.rng = None if rng is None else np.random.default_rng(rng)
 
-            self.cards.append(KingCard(color))
+    @property
+    def codes(self):
+        """
+        :return: The integer codes of the cards left in the deck.
+        """
+        return self.order[self.top:]
 
-            self.cards.append(AceCard(color))
+    @property
+    def cards(self):
+        """
+        :return: The cards left in the deck, as a list of PlayingCard's.
+        """
+        return ints_to_cards(self.order[self.top:])
 
     def shuffle(self):
         """
-        This method shuffles the deck.
+        This method shuffles the cards left in the deck.
 
         :return: Shuffles the deck.
         """
-        shuffle(self.cards)
+        remaining = self.order[self.top:]
+        if self.rng is None:
+            shuffle(remaining)
+        else:
+            self.rng.shuffle(remaining)
+        self.order[self.top:] = remaining
+
+    def set_order(self, codes):
+        """
+        Puts all cards back in the deck in the given order, for instance a row from shuffled_decks.
+
+        :param codes: The 52 card codes, the top card first.
+        """
+        if len(codes) != 52 or set(codes) != set(NEW_DECK_ORDER):
+            raise ValueError("The order must contain every card exactly once")
+        self.order[:] = [int(code) for code in codes]
+        self.top = 0
+
+    def reset(self):
+        """
+        Puts all cards back in the deck in their original order, reusing the same list.
+        """
+        self.order[:] = NEW_DECK_ORDER
+        self.top = 0
 
     def take_top(self):
         """
@@ -149,28 +294,113 @@ class StandardDeck:
 
         :return: the top_card of type PlayingCard
         """
-        top_card = self.cards.pop(0)
+        top_card = CARDS[self.order[self.top]]
+        self.top += 1
         return top_card
 
+    def take_top_int(self):
+        """
+        This method takes the top card and removes it from the deck.
+
+        :return: the integer code of the top card
+        """
+        code = self.order[self.top]
+        self.top += 1
+        return code
+
+    def take_n(self, n):
+        """
+        Takes the n top cards from the deck.
+
+        :param n: The number of cards to take.
+        :return: A list of PlayingCard's, the former top card first.
+        """
+        return ints_to_cards(self.take_n_int(n))
+
+    def take_n_int(self, n):
+        """
+        Takes the n top cards from the deck.
+
+        :param n: The number of cards to take.
+        :return: A list with the integer codes of the cards, the former top card first.
+        """
+        if self.top + n > len(self.order):
+            raise IndexError("Trying to take more cards than there are left in the deck")
+        codes = self.order[self.top:self.top + n]
+        self.top += n
+        return codes
+
+    def burn(self):
+        """
+        Discards the top card, as the dealer does before dealing the flop, turn and river.
+
+        :return: the integer code of the burnt card
+        """
+        return self.take_top_int()
+
+    def __len__(self):
+        return len(self.order) - self.top
+
+
+def spawn_generators(seed, n):
+    """
+    Creates independent random generators, for instance one per worker process or per deck.
+
+    :param seed: Seed for numpy.random.SeedSequence, None for a fresh random seed.
+    :param n: The number of generators.
+    :return: A list of n numpy.random.Generator's with statistically independent streams.
+    """
+    return [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(n)]
+
+
+def shuffled_decks(k, rng=None):
+    """
+    Shuffles k decks in one call.
+
+    :param k: The number of decks.
+    :param rng: A numpy.random.Generator, or anything numpy.random.default_rng accepts.
+    :return: An int8 array of shape (k, 52) where every row is an independent random order of the card codes.
+    """
+    rng = np.random.default_rng(rng)
+    return rng.permuted(np.tile(np.arange(52, dtype=np.int8), (k, 1)), axis=1)
+
 
 class Hand:
     """
     The Hand class represents a hand of a player which contains cards. Cards can be added and removed from the hand
     as well as sort the cards in the hand. It can also evaluate which combination of cards gives the best pokerhand.
+
+    The hand keeps a summary of its cards up to date as cards are added and removed: the number of cards of every
+    rank and suit, the 52 bit mask of the card codes (which holds the rank mask of every suit) and the rank and suit
+    keys of the lookup evaluator. Summaries of disjoint hands can be merged, see best_poker_hand.
     """
 
     def __init__(self):
         self.cards = []
+        self.rank_counts = [0]*13
+        self.suit_counts = [0]*4
+        self.card_mask = 0
+        self.rank_key = 0
+        self.suit_key = 0
 
     def add_card(self, card):
         """
-        :param card: An object of type PlayingCard
+        :param card: An object of type PlayingCard, or the integer code of a card
         :return: Nothing, it adds a card to the players Hand object
         """
         if isinstance(card, PlayingCard):
             self.cards.append(card)
+        elif isinstance(card, numbers.Integral) and 0 <= card < 52:
+            card = CARDS[int(card)]
+            self.cards.append(card)
         else:
             raise TypeError("Wrong kind of card!")
+        code = card.code
+        self.rank_counts[code % 13] += 1
+        self.suit_counts[code // 13] += 1
+        self.card_mask |= 1 << code
+        self.rank_key += _CODE_RANK_KEYS[code]
+        self.suit_key += _CODE_SUIT_KEYS[code]
 
     def remove_card(self, index):
         """
@@ -182,10 +412,39 @@ class Hand:
         if type(index) == list and len(index) > 0:
             if len(self.cards) - max(index) > 0:
                 for i in index:
-                    self.cards.pop(i)
+                    code = self.cards.pop(i).code
+                    self.rank_counts[code % 13] -= 1
+                    self.suit_counts[code // 13] -= 1
+                    self.card_mask &= ~(1 << code)
+                    self.rank_key -= _CODE_RANK_KEYS[code]
+                    self.suit_key -= _CODE_SUIT_KEYS[code]
             else:
                 raise IndexError("Trying to remove a card that doesn't exist")
 
+    def clear(self):
+        """
+        Removes all cards from the Hand.
+        """
+        self.cards.clear()
+        self.rank_counts[:] = [0]*13
+        self.suit_counts[:] = [0]*4
+        self.card_mask = 0
+        self.rank_key = 0
+        self.suit_key = 0
+
+    def suit_mask(self, suit):
+        """
+        :param suit: A suit, as Suits or its integer value.
+        :return: A 13 bit mask of the ranks held in the suit, deuce in the lowest bit.
+        """
+        return (self.card_mask >> (13*suit)) & 0x1FFF
+
+    def summary(self):
+        """
+        :return: The rank key, suit key and card mask of the cards in Hand, see evaluate_summary_batch.
+        """
+        return self.rank_key, self.suit_key, self.card_mask
+
     def sort_hand(self):
         """
         Sorts the hand by suit and then by value.
@@ -194,58 +453,59 @@ class Hand:
         """
         self.cards.sort(key=lambda k: [k.get_suit().value, k.get_value()])
 
+    def codes(self):
+        """
+        :return: The integer codes of the cards in Hand.
+        """
+        return cards_to_ints(self.cards)
+
     def best_poker_hand_total(self, table_cards):
         """
         A simple method which collects all cards for a player, which includes the cards represented on the table in
         certain games.
 
-        :param table_cards: Cards in a list representing tha cards on the table.
+        :param table_cards: Cards in a list representing tha cards on the table, or a Board.
         :return: a list of all possible cards for a player.
         """
+        if isinstance(table_cards, Hand):
+            table_cards = table_cards.cards
         total_cards = self.cards + table_cards
         return total_cards
 
-    def best_poker_hand(self, table_cards):
+    def best_poker_hand(self, table_cards, mode=None):
         """
         This method evaluates which cards in Hand makes best possible combination of cards.
 
-        :param table_cards: A list of cards represented on the table
+        :param table_cards: A list of cards represented on the table, or a Board. The lookup evaluator merges the
+        summary of a Board with the one of Hand instead of going through the cards again.
+        :param mode: The EvaluatorMode (or its name) to use, defaults to the mode chosen with set_evaluator_mode.
         :return: A PokerHand which is fully comparable with other PokerHand's with the normal comparable operators.
         """
+        mode = evaluator_mode if mode is None else EvaluatorMode(mode)
+        if mode == EvaluatorMode.lookup:
+            if isinstance(table_cards, Hand):
+                summary = (self.rank_key + table_cards.rank_key, self.suit_key + table_cards.suit_key,
+                           self.card_mask | table_cards.card_mask)
+            else:
+                summary = summarize_codes([card.code for card in table_cards], self.summary())
+            return poker_hand_from_strength(summary_strength(*summary))
         total_cards = self.best_poker_hand_total(table_cards)
-        value_cards, list, suit_cards = create_bins_for_cards(total_cards)
-        cond, best_hand = straight_flush_test(total_cards, suit_cards, list, value_cards)
-        if cond:
-            return best_hand
-        cond, best_hand = four_of_a_kind_test(list, value_cards)
-        if cond:
-            return best_hand
-        cond, best_hand = full_house_test(list)
-        if cond:
-            return best_hand
-        cond, best_hand = flush_test(total_cards, suit_cards, list)
-        if cond:
-            return best_hand
-        cond, best_hand = straight_test(list, value_cards)
-        if cond:
-            return best_hand
-        cond, best_hand = three_of_a_kind_test(list, value_cards)
-        if cond:
-            return best_hand
-        cond, best_hand = two_pairs_test(list, value_cards)
-        if cond:
-            return best_hand
-        cond, best_hand = one_pair_test(list)
-        if cond:
-            return best_hand
-        cond, best_hand = high_card_test(list)
-        if cond:
-            return best_hand
+        if evaluation_cache is not None:
+            return evaluation_cache.best_poker_hand(total_cards)
+        return chain_poker_hand(total_cards)
 
     def __len__(self):
         return len(self.cards)
 
 
+class Board(Hand):
+    """
+    The cards on the table. A Board keeps the same summary as a Hand, so it can be passed to Hand.best_poker_hand
+    for every player and only the cards dealt since the last street have to be added.
+    """
+    pass
+
+
 def straight_flush_test(cards, suit_cards, list, value_cards):
     """
     A method to evaluate if the player has a straight flush.
@@ -391,9 +651,8 @@ def two_pairs_test(list, value_cards):
     :return: Returns True and a PokerHand object if the player has two pairs, otherwise False and None.
     """
     if 2 in list and list.count(2) > 1:
-        values = np.array(list)
         searchval = 2
-        ii = np.where(values == searchval)[0]
+        ii = [i for i, count in enumerate(list) if count == searchval]
         a = int(ii[-1])
         b = int(ii[-2])
         #print('You got two pairs in {}:s over {}:s'.format(kinds_of_values[a],
@@ -414,9 +673,8 @@ def one_pair_test(list):
     """
     if list.count(2) == 1:
         if list.count(1) > 0:
-            values = np.array(list)
             searchval = 1
-            ii = np.where(values == searchval)[0]
+            ii = [i for i, count in enumerate(list) if count == searchval]
             a = int(ii[-1])+2
             b = int(ii[-2])+2
             c = int(ii[-3])+2
@@ -437,9 +695,8 @@ def high_card_test(list):
     :return: Returns True and a PokerHand object with the highest cards in the players Hand.
     """
     hand_rank = PokerHandType.high_card.value
-    values = np.array(list)
     searchval = 1
-    ii = np.where(values == searchval)[0]
+    ii = [i for i, count in enumerate(list) if count == searchval]
     a = []
     for value in ii:
         a.append(value+2)
@@ -471,6 +728,43 @@ def create_bins_for_cards(cards):
     return value_cards, list, suit_cards
 
 
+def chain_poker_hand(cards):
+    """
+    Evaluates cards with the *_test functions, from the best PokerHandType down.
+
+    :param cards: All cards available for a player.
+    :return: The PokerHand of the cards.
+    """
+    value_cards, list, suit_cards = create_bins_for_cards(cards)
+    cond, best_hand = straight_flush_test(cards, suit_cards, list, value_cards)
+    if cond:
+        return best_hand
+    cond, best_hand = four_of_a_kind_test(list, value_cards)
+    if cond:
+        return best_hand
+    cond, best_hand = full_house_test(list)
+    if cond:
+        return best_hand
+    cond, best_hand = flush_test(cards, suit_cards, list)
+    if cond:
+        return best_hand
+    cond, best_hand = straight_test(list, value_cards)
+    if cond:
+        return best_hand
+    cond, best_hand = three_of_a_kind_test(list, value_cards)
+    if cond:
+        return best_hand
+    cond, best_hand = two_pairs_test(list, value_cards)
+    if cond:
+        return best_hand
+    cond, best_hand = one_pair_test(list)
+    if cond:
+        return best_hand
+    cond, best_hand = high_card_test(list)
+    if cond:
+        return best_hand
+
+
 class PokerHandType(enum.IntEnum):
     """
     A PokerHandType class which specifies which kind of PokerHand is worth the most.
@@ -491,12 +785,705 @@ class PokerHand:
     Uses PokerHandType to create an PokerHand object. Overrides some comparable operators for easier comparisons.
     """
     # Använder PokerHandType för PokerHand objektet
-    def __init__(self, hand_rank, rank_value):
+    def __init__(self, hand_rank, rank_value, strength=None):
         # Value of hand
         self.hand_rank = hand_rank
         # Value of e.g. the pair
         self.rank_value = rank_value
+        # Both packed into one integer, see make_strength. Only the five most significant values are kept, as a
+        # poker hand never has more than five cards.
+        if strength is None:
+            strength = make_strength(hand_rank, _flatten_rank_value(rank_value))
+        self.strength = int(strength)
 
     def __lt__(self, hand2):
-        return (self.hand_rank, self.rank_value) < (hand2.hand_rank, hand2.rank_value)
+        return self.strength < hand2.strength
+
+    def __le__(self, hand2):
+        return self.strength <= hand2.strength
+
+    def __gt__(self, hand2):
+        return self.strength > hand2.strength
+
+    def __ge__(self, hand2):
+        return self.strength >= hand2.strength
+
+    def __eq__(self, hand2):
+        return isinstance(hand2, PokerHand) and self.strength == hand2.strength
+
+    def __hash__(self):
+        return self.strength
+
+    def __int__(self):
+        return self.strength
+
+    def __str__(self):
+        return PokerHandType(self.hand_rank).name + " " + str(self.rank_value)
+
+
+def _flatten_rank_value(rank_value):
+    """
+    :param rank_value: A card value or a possibly nested tuple of card values, as made by the *_test functions.
+    :return: The card values as a flat list of integers.
+    """
+    if isinstance(rank_value, tuple):
+        values = []
+        for value in rank_value:
+            values.extend(_flatten_rank_value(value))
+        return values
+    return [int(rank_value)]
+
+
+class EvaluatorMode(enum.Enum):
+    """
+    The evaluators available behind Hand.best_poker_hand. The chain mode runs the *_test functions one after
+    another, while the lookup mode reads the strength of the hand from precomputed tables.
+    """
+    chain = 'chain'
+    lookup = 'lookup'
+
+
+evaluator_mode = EvaluatorMode.chain
+
+
+def set_evaluator_mode(mode):
+    """
+    Selects which evaluator Hand.best_poker_hand uses when no mode is given.
+
+    :param mode: An EvaluatorMode, or its name as a string.
+    :return: The previously selected EvaluatorMode.
+    """
+    global evaluator_mode
+    previous = evaluator_mode
+    evaluator_mode = EvaluatorMode(mode)
+    return previous
+
+
+class EvaluationCache:
+    """
+    A bounded cache of hands evaluated by the *_test chain, with least-recently-used eviction. Hands are looked up
+    by the codes of their cards in order, since flush_test reports the last card of the flush in the order the
+    cards are given. The lookup evaluator is not cached: reading its tables costs no more than building a key.
+    """
+    def __init__(self, maxsize=1 << 16):
+        """
+        :param maxsize: The largest number of hands kept in the cache.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+
+    def best_poker_hand(self, cards):
+        """
+        :param cards: All cards available for a player, see Hand.best_poker_hand_total.
+        :return: The PokerHand of the cards as chain_poker_hand evaluates it, from the cache if possible.
+        """
+        key = tuple([card.code for card in cards])
+        entries = self.entries
+        hand = entries.get(key)
+        if hand is not None:
+            self.hits += 1
+            entries.move_to_end(key)
+            return hand
+        self.misses += 1
+        hand = entries[key] = chain_poker_hand(cards)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        return hand
+
+    def clear(self):
+        """
+        Empties the cache and resets the counters.
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
 
+evaluation_cache = None
+
+
+def set_evaluation_cache(cache):
+    """
+    Puts an EvaluationCache in front of the chain evaluator in Hand.best_poker_hand.
+
+    :param cache: An EvaluationCache, or None to evaluate every hand again.
+    :return: The previously installed cache.
+    """
+    global evaluation_cache
+    previous = evaluation_cache
+    evaluation_cache = cache
+    return previous
+
+
+# A strength is one integer: the PokerHandType in the top bits followed by up to five card values (2-14),
+# four bits each, most significant first. Comparing two strengths compares the hands.
+STRENGTH_SHIFT = 20
+
+# Adding up 5**rank for every card gives a unique key for each multiset of ranks, and adding up 8**suit keeps a
+# three bit counter per suit. Both are sums, so they can be built one card at a time.
+_RANK_KEYS = tuple(5 ** rank for rank in range(13))
+_SUIT_KEYS = tuple(1 << (3 * suit) for suit in range(4))
+_CODE_RANK_KEYS = tuple(_RANK_KEYS[code % 13] for code in range(52))
+_CODE_SUIT_KEYS = tuple(_SUIT_KEYS[code // 13] for code in range(52))
+_STRAIGHT_MASKS = tuple((0x1F << (high - 4), high + 2) for high in range(12, 3, -1)) + ((0x100F, 5),)
+
+_rank_table = None
+_flush_suit_table = None
+_flush_table = None
+_lookup_arrays = None
+
+
+def make_strength(hand_type, values):
+    """
+    Packs a PokerHandType and the card values deciding between hands of that type into a strength.
+
+    :param hand_type: The PokerHandType of the hand.
+    :param values: Up to five card values, most significant first.
+    :return: An integer which orders the same way as the hands.
+    """
+    strength = int(hand_type)
+    for i in range(5):
+        strength = (strength << 4) | (values[i] if i < len(values) else 0)
+    return strength
+
+
+def poker_hand_from_strength(strength):
+    """
+    Unpacks a strength into a PokerHand.
+
+    :param strength: An integer created by make_strength.
+    :return: A PokerHand with the PokerHandType as hand_rank and the card values as rank_value.
+    """
+    strength = int(strength)
+    values = []
+    for shift in range(STRENGTH_SHIFT - 4, -4, -4):
+        value = (strength >> shift) & 0xF
+        if value:
+            values.append(value)
+    return PokerHand(strength >> STRENGTH_SHIFT, tuple(values), strength)
+
+
+def _straight_high(mask):
+    for straight, high in _STRAIGHT_MASKS:
+        if mask & straight == straight:
+            return high
+    return 0
+
+
+def _top_values(mask, n, exclude=()):
+    values = []
+    for rank in range(12, -1, -1):
+        if len(values) == n:
+            break
+        if mask >> rank & 1 and rank + 2 not in exclude:
+            values.append(rank + 2)
+    return values
+
+
+def _rank_strength(counts):
+    """
+    Evaluates a multiset of ranks without looking at suits.
+
+    :param counts: A list with the number of cards of each rank, deuce first.
+    :return: The strength of the best hand that can be made from the ranks.
+    """
+    mask = 0
+    groups = {1: [], 2: [], 3: [], 4: []}
+    for rank in range(12, -1, -1):
+        if counts[rank]:
+            mask |= 1 << rank
+            groups[counts[rank]].append(rank + 2)
+    if groups[4]:
+        quad = groups[4][0]
+        return make_strength(PokerHandType.four_of_a_kind, [quad] + _top_values(mask, 1, (quad,)))
+    if groups[3] and len(groups[3]) + len(groups[2]) > 1:
+        trips = groups[3][0]
+        pair = max(groups[3][1:] + groups[2])
+        return make_strength(PokerHandType.full_house, [trips, pair])
+    high = _straight_high(mask)
+    if high:
+        return make_strength(PokerHandType.straight, [high])
+    if groups[3]:
+        trips = groups[3][0]
+        return make_strength(PokerHandType.three_of_a_kind, [trips] + _top_values(mask, 2, (trips,)))
+    if len(groups[2]) > 1:
+        pairs = groups[2][:2]
+        return make_strength(PokerHandType.two_pair, pairs + _top_values(mask, 1, pairs))
+    if groups[2]:
+        pair = groups[2][0]
+        return make_strength(PokerHandType.pair, [pair] + _top_values(mask, 3, (pair,)))
+    return make_strength(PokerHandType.high_card, _top_values(mask, 5))
+
+
+def _flush_strength(mask):
+    """
+    Evaluates five or more cards of the same suit.
+
+    :param mask: A 13 bit mask of the ranks in the suit, deuce in the lowest bit.
+    :return: The strength of the straight flush or flush.
+    """
+    high = _straight_high(mask)
+    if high:
+        return make_strength(PokerHandType.straight_flush, [high])
+    return make_strength(PokerHandType.flush, _top_values(mask, 5))
+
+
+def _build_lookup_tables():
+    """
+    Builds the tables used by lookup_strength: every multiset of up to seven ranks, which suit (if any) holds a
+    flush for every combination of suit counts, and every 13 bit flush mask.
+    """
+    global _rank_table, _flush_suit_table, _flush_table
+    rank_table = {}
+    counts = [0]*13
+
+    def fill(rank, cards_left, key):
+        if rank == 13:
+            rank_table[key] = _rank_strength(counts)
+            return
+        for count in range(min(4, cards_left) + 1):
+            counts[rank] = count
+            fill(rank + 1, cards_left - count, key + count * _RANK_KEYS[rank])
+        counts[rank] = 0
+
+    fill(0, 7, 0)
+
+    flush_suit_table = [-1]*(1 << 12)
+    for key in range(1 << 12):
+        for suit in range(4):
+            if (key >> (3 * suit)) & 7 >= 5:
+                flush_suit_table[key] = suit
+
+    flush_table = [0]*(1 << 13)
+    for mask in range(1 << 13):
+        if bin(mask).count('1') >= 5:
+            flush_table[mask] = _flush_strength(mask)
+
+    _rank_table, _flush_suit_table, _flush_table = rank_table, flush_suit_table, flush_table
+
+
+def lookup_strength(cards):
+    """
+    Evaluates up to seven cards with a few table reads instead of the *_test chain. The tables are built the
+    first time this function is called.
+
+    :param cards: The cards available for the player to evaluate.
+    :return: The strength of the best poker hand, see make_strength.
+    """
+    return lookup_strength_codes([card.code for card in cards])
+
+
+def lookup_strength_codes(codes):
+    """
+    Same as lookup_strength, but for the integer codes of the cards.
+
+    :param codes: The integer codes of up to seven cards.
+    :return: The strength of the best poker hand, see make_strength.
+    """
+    return summary_strength(*summarize_codes(codes))
+
+
+def summarize_codes(codes, start=(0, 0, 0)):
+    """
+    Builds the rank key, suit key and card mask of some cards, which is all the lookup evaluator needs.
+
+    :param codes: The integer codes of the cards.
+    :param start: The summary of other cards (without any of the codes) to add the cards to.
+    :return: The rank key, suit key and card mask as a tuple.
+    """
+    rank_key, suit_key, card_mask = start
+    for code in codes:
+        rank_key += _CODE_RANK_KEYS[code]
+        suit_key += _CODE_SUIT_KEYS[code]
+        card_mask |= 1 << code
+    return rank_key, suit_key, card_mask
+
+
+def summary_strength(rank_key, suit_key, card_mask):
+    """
+    Evaluates up to seven cards from their summary, see summarize_codes.
+
+    :param rank_key: The sum of the rank keys of the cards.
+    :param suit_key: The sum of the suit keys of the cards.
+    :param card_mask: The 52 bit mask of the card codes.
+    :return: The strength of the best poker hand, see make_strength.
+    """
+    if _rank_table is None:
+        _build_lookup_tables()
+    strength = _rank_table[rank_key]
+    flush_suit = _flush_suit_table[suit_key]
+    if flush_suit >= 0:
+        strength = max(strength, _flush_table[(card_mask >> (13*flush_suit)) & 0x1FFF])
+    return strength
+
+
+def _get_lookup_arrays():
+    """
+    The lookup tables as NumPy arrays: the sorted rank keys with their strengths, the flush suit table, the flush
+    table and the per-code rank and suit keys.
+    """
+    global _lookup_arrays
+    if _lookup_arrays is None:
+        if _rank_table is None:
+            _build_lookup_tables()
+        rank_keys = np.array(sorted(_rank_table), dtype=np.int64)
+        rank_strengths = np.array([_rank_table[key] for key in rank_keys.tolist()], dtype=np.int32)
+        _lookup_arrays = (rank_keys, rank_strengths,
+                          np.array(_flush_suit_table, dtype=np.int8),
+                          np.array(_flush_table, dtype=np.int32),
+                          np.array(_CODE_RANK_KEYS, dtype=np.int64),
+                          np.array(_CODE_SUIT_KEYS, dtype=np.int64))
+    return _lookup_arrays
+
+
+_LOOKUP_ARRAY_NAMES = ('rank_keys', 'rank_strengths', 'flush_suits', 'flush_strengths', 'code_rank_keys',
+                       'code_suit_keys')
+
+
+def lookup_arrays():
+    """
+    :return: A dictionary with the NumPy lookup tables of the batch evaluator by name, built if needed.
+    """
+    return dict(zip(_LOOKUP_ARRAY_NAMES, _get_lookup_arrays()))
+
+
+def install_lookup_arrays(arrays):
+    """
+    Makes the batch evaluator use the given lookup tables instead of building its own, for instance read-only views
+    of tables another process has published in shared memory (see shared_tables).
+
+    :param arrays: A dictionary as returned by lookup_arrays.
+    """
+    global _lookup_arrays
+    _lookup_arrays = tuple(arrays[name] for name in _LOOKUP_ARRAY_NAMES)
+
+
+def evaluate_summary_batch(rank_keys, suit_keys, card_masks):
+    """
+    Evaluates many hands given as the sums and masks that lookup_strength_codes builds for each hand: the sum of
+    the rank keys, the sum of the suit keys and the 52 bit mask with bit code set for every card. All three are
+    additive over disjoint sets of cards, so hole cards and boards can be summarised separately and combined.
+
+    :param rank_keys: An int64 array with the rank key of every hand.
+    :param suit_keys: An int64 array with the suit key of every hand.
+    :param card_masks: A uint64 array with the card mask of every hand.
+    :return: An int32 array with the strength of every hand, see make_strength.
+    """
+    table_keys, table_strengths, flush_suits, flush_strengths = _get_lookup_arrays()[:4]
+    positions = np.minimum(np.searchsorted(table_keys, rank_keys), len(table_keys) - 1)
+    # A key that is not in the table comes from more than four cards of a rank, or more than seven cards
+    if not np.array_equal(table_keys[positions], rank_keys):
+        raise ValueError("Some hands are not a set of up to seven different cards")
+    strengths = table_strengths[positions]
+    flush_suit = flush_suits[suit_keys]
+    flushes = np.flatnonzero(flush_suit >= 0)
+    if len(flushes):
+        shift = (13*flush_suit[flushes]).astype(np.uint64)
+        masks = (np.asarray(card_masks, dtype=np.uint64)[flushes] >> shift) & np.uint64(0x1FFF)
+        strengths[flushes] = np.maximum(strengths[flushes], flush_strengths[masks.astype(np.intp)])
+    return strengths
+
+
+def summarize_batch(codes):
+    """
+    Builds the rank keys, suit keys and card masks of many hands at once, see evaluate_summary_batch.
+
+    :param codes: An integer array of shape (N, k) with the card codes of N hands of k cards each.
+    :return: The rank keys, suit keys and card masks as three arrays of shape (N,).
+    """
+    code_rank_keys, code_suit_keys = _get_lookup_arrays()[4:]
+    codes = np.asarray(codes, dtype=np.intp)
+    rank_keys = code_rank_keys[codes].sum(axis=1)
+    suit_keys = code_suit_keys[codes].sum(axis=1)
+    card_masks = np.bitwise_or.reduce(np.left_shift(np.uint64(1), codes.astype(np.uint64)), axis=1)
+    return rank_keys, suit_keys, card_masks
+
+
+def evaluate_batch(codes, chunk_size=1 << 18):
+    """
+    Evaluates many hands in one vectorized pass, giving the same strengths as lookup_strength_codes. Codes outside
+    0 to 51 and hands holding the same card twice raise a ValueError.
+
+    :param codes: An integer array of shape (N, k) with the card codes of N hands of k cards each, 1 <= k <= 7.
+    :param chunk_size: How many hands are evaluated at a time, which bounds the size of the temporary arrays.
+    :return: An int32 array of shape (N,) with the strength of every hand.
+    """
+    codes = np.asarray(codes)
+    if codes.ndim != 2 or not 0 < codes.shape[1] <= 7:
+        raise ValueError("Expected an array of shape (N, k) with 1 to 7 cards per hand")
+    if codes.size and not (codes.min() >= 0 and codes.max() < 52):
+        raise ValueError("Card codes must be between 0 and 51")
+    strengths = np.empty(len(codes), dtype=np.int32)
+    for start in range(0, len(codes), chunk_size):
+        chunk = codes[start:start + chunk_size]
+        rank_keys, suit_keys, card_masks = summarize_batch(chunk)
+        # The bits of different cards add up to their mask, while a card given twice carries into another bit
+        if not np.array_equal(np.left_shift(np.uint64(1), chunk.astype(np.uint64)).sum(axis=1), card_masks):
+            raise ValueError("The same card can not be used twice in a hand")
+        strengths[start:start + len(chunk)] = evaluate_summary_batch(rank_keys, suit_keys, card_masks)
+    return strengths
+
+
+# Preflop equities are stored in a binary file: a 16 byte header (magic, version, number of starting hands and the
+# largest number of players), the 169x169 head-to-head equities and the equities against 1 to 8 random hands,
+# all as little-endian float32.
+PREFLOP_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables', 'preflop_equity.bin')
+PREFLOP_TABLE_MAGIC = b'PFEQ'
+PREFLOP_TABLE_VERSION = 1
+PREFLOP_MAX_PLAYERS = 9
+_PREFLOP_HEADER = [('magic', 'S4'), ('version', '<u4'), ('hands', '<u4'), ('max_players', '<u4')]
+_VALUE_NAMES = '23456789TJQKA'
+
+_preflop_tables = None
+
+
+def starting_hand_index(cards):
+    """
+    Maps two hole cards to one of the 169 starting hands. The index is high*13 + low for suited hands, low*13 + high
+    for offsuit hands and rank*13 + rank for pairs, where the ranks count from 0 for a deuce.
+
+    :param cards: Two PlayingCard's or integer card codes.
+    :return: The index of the starting hand, ranging from 0 to 168.
+    """
+    first, second = to_codes(cards)
+    high, low = max(first % 13, second % 13), min(first % 13, second % 13)
+    if first // 13 == second // 13:
+        return high*13 + low
+    return low*13 + high
+
+
+def starting_hand_name(index):
+    """
+    :param index: The index of a starting hand, see starting_hand_index.
+    :return: The name of the starting hand, for instance "AKs", "T9o" or "77".
+    """
+    row, column = divmod(index, 13)
+    if row == column:
+        return _VALUE_NAMES[row]*2
+    elif row > column:
+        return _VALUE_NAMES[row] + _VALUE_NAMES[column] + 's'
+    return _VALUE_NAMES[column] + _VALUE_NAMES[row] + 'o'
+
+
+def starting_hand_combos(index):
+    """
+    :param index: The index of a starting hand, see starting_hand_index.
+    :return: A list with the hole card codes of every combination of the starting hand (6 for a pair, 4 for a
+    suited hand and 12 for an offsuit hand).
+    """
+    row, column = divmod(index, 13)
+    high, low = max(row, column), min(row, column)
+    combos = []
+    for suit1 in range(4):
+        for suit2 in range(4):
+            if row == column and suit1 < suit2 or row > column and suit1 == suit2 or row < column and suit1 != suit2:
+                combos.append((suit1*13 + high, suit2*13 + low))
+    return combos
+
+
+def write_preflop_tables(path, head_to_head, vs_random):
+    """
+    Writes preflop equities in the format read by load_preflop_tables.
+
+    :param path: The file to write.
+    :param head_to_head: A (169, 169) array with the equity of the row hand against the column hand.
+    :param vs_random: A (PREFLOP_MAX_PLAYERS-1, 169) array, row n-2 holding the equities against n-1 random hands.
+    """
+    header = np.array([(PREFLOP_TABLE_MAGIC, PREFLOP_TABLE_VERSION, 169, PREFLOP_MAX_PLAYERS)],
+                      dtype=np.dtype(_PREFLOP_HEADER))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(header.tobytes())
+        file.write(np.asarray(head_to_head, dtype='<f4').tobytes())
+        file.write(np.asarray(vs_random, dtype='<f4').tobytes())
+
+
+def load_preflop_tables(path=PREFLOP_TABLE_PATH):
+    """
+    Maps the preflop equity file into memory. Nothing is read until a value is looked up, and the pages are shared
+    by all processes that map the same file. The file is created by preflop_tables.py.
+
+    :param path: The file to load.
+    :return: The head-to-head equities with shape (169, 169) and the equities against random hands with shape
+    (PREFLOP_MAX_PLAYERS-1, 169), both as read-only memory maps.
+    """
+    header_type = np.dtype(_PREFLOP_HEADER)
+    header = np.fromfile(path, dtype=header_type, count=1)
+    if len(header) == 0 or header['magic'][0] != PREFLOP_TABLE_MAGIC:
+        raise ValueError("{} is not a preflop equity file".format(path))
+    if header['version'][0] != PREFLOP_TABLE_VERSION or header['hands'][0] != 169:
+        raise ValueError("{} has version {}, expected {}".format(path, header['version'][0], PREFLOP_TABLE_VERSION))
+    players = int(header['max_players'][0])
+    offset = header_type.itemsize
+    head_to_head = np.memmap(path, dtype='<f4', mode='r', offset=offset, shape=(169, 169))
+    offset += head_to_head.nbytes
+    vs_random = np.memmap(path, dtype='<f4', mode='r', offset=offset, shape=(players - 1, 169))
+    return head_to_head, vs_random
+
+
+def _get_preflop_tables():
+    global _preflop_tables
+    if _preflop_tables is None:
+        _preflop_tables = load_preflop_tables()
+    return _preflop_tables
+
+
+def preflop_equity(hand, other):
+    """
+    Looks up the preflop equity of one starting hand against another, loading the tables on first use.
+
+    :param hand: Two hole cards, or the index of a starting hand.
+    :param other: Two hole cards, or the index of a starting hand.
+    :return: The share of the pot hand wins on average against other.
+    """
+    if not isinstance(hand, numbers.Integral):
+        hand = starting_hand_index(hand)
+    if not isinstance(other, numbers.Integral):
+        other = starting_hand_index(other)
+    return float(_get_preflop_tables()[0][hand, other])
+
+
+def preflop_equity_vs_random(hand, players=2):
+    """
+    Looks up the preflop equity of a starting hand against random hands, loading the tables on first use.
+
+    :param hand: Two hole cards, or the index of a starting hand.
+    :param players: The number of players at the table including this one, from 2 to PREFLOP_MAX_PLAYERS.
+    :return: The share of the pot the hand wins on average.
+    """
+    if not isinstance(hand, numbers.Integral):
+        hand = starting_hand_index(hand)
+    if not 2 <= players <= PREFLOP_MAX_PLAYERS:
+        raise ValueError("The number of players must be between 2 and {}".format(PREFLOP_MAX_PLAYERS))
+    return float(_get_preflop_tables()[1][players - 2, hand])
+
+
+_SUIT_NAMES = 'cdsh'
+_RANGE_COMBO = re.compile(r'^([2-9TJQKA][cdsh])([2-9TJQKA][cdsh])$')
+_RANGE_HANDS = re.compile(r'^([2-9TJQKA])([2-9TJQKA])([so]?)(\+|-([2-9TJQKA])([2-9TJQKA])\3)?$')
+
+
+class HandRange:
+    """
+    A range of hole cards: a weight between 0 and 1 for every combination of two cards a player may hold. Ranges
+    are usually written in the standard notation, see parse.
+    """
+    def __init__(self, weights=None):
+        """
+        :param weights: A dictionary mapping pairs of card codes to their weight.
+        """
+        self.weights = dict()
+        for cards, weight in (weights or {}).items():
+            self.add(cards, weight)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Reads a range such as "AKs, TT+, 98o, A5s-A2s, KQ:0.5, AhKh". Every comma separated part is one of
+
+        - a pair "TT", all pairs from a pair up "TT+", or the pairs between two pairs "22-55",
+        - two ranks with s for suited or o for offsuit, or neither for both "AK",
+        - two ranks with + for all hands up to one rank below the first "KTs+", or a span with the same first rank
+          "A5s-A2s",
+        - a single combination "AhKh", with the suits c, d, s and h,
+
+        optionally followed by ":" and the weight of the combinations. A later part overrides the weight of the
+        combinations an earlier part already gave.
+
+        :param text: The range in the notation above.
+        :return: A HandRange.
+        """
+        hand_range = cls()
+        for part in text.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            notation, _, weight = part.partition(':')
+            weight = float(weight) if weight else 1.0
+            for combo in _parse_range_part(notation.strip()):
+                hand_range.add(combo, weight)
+        return hand_range
+
+    def add(self, cards, weight=1.0):
+        """
+        :param cards: Two PlayingCard's or integer card codes.
+        :param weight: The weight of the combination, 0 removes it.
+        """
+        first, second = to_codes(cards)
+        if first == second or not (0 <= first < 52 and 0 <= second < 52):
+            raise ValueError("A combination needs two different cards")
+        if not 0 <= weight <= 1:
+            raise ValueError("The weight of a combination must be between 0 and 1")
+        combo = (min(first, second), max(first, second))
+        if weight:
+            self.weights[combo] = weight
+        else:
+            self.weights.pop(combo, None)
+
+    def combos(self, dead=()):
+        """
+        :param dead: Cards that can not be in the hand, as PlayingCard's or integer codes.
+        :return: The combinations as an array of shape (N, 2) with card codes, and their weights as an array of
+        shape (N,). Combinations holding a dead card are left out.
+        """
+        dead = set(to_codes(dead))
+        combos = [combo for combo in sorted(self.weights) if combo[0] not in dead and combo[1] not in dead]
+        return (np.array(combos, dtype=np.intp).reshape(-1, 2),
+                np.array([self.weights[combo] for combo in combos], dtype=np.float64))
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __contains__(self, cards):
+        first, second = to_codes(cards)
+        return (min(first, second), max(first, second)) in self.weights
+
+
+def _parse_range_part(notation):
+    """
+    :param notation: One part of a range, without weight, see HandRange.parse.
+    :return: A list with the hole card codes of every combination.
+    """
+    match = _RANGE_COMBO.match(notation)
+    if match:
+        return [tuple(_SUIT_NAMES.index(card[1])*13 + _VALUE_NAMES.index(card[0]) for card in match.groups())]
+    match = _RANGE_HANDS.match(notation)
+    if not match:
+        raise ValueError("Can not read '{}' in the range".format(notation))
+    first, second, kind, span, last_first, last_second = match.groups()
+    high, low = _VALUE_NAMES.index(first), _VALUE_NAMES.index(second)
+    pair = high == low
+    if pair and kind:
+        raise ValueError("Can not read '{}' in the range, pairs are neither suited nor offsuit".format(notation))
+    if low > high:
+        raise ValueError("Can not read '{}' in the range, write the highest rank first".format(notation))
+
+    # The (high, low) ranks of every hand the part stands for
+    if not span:
+        hands = [(high, low)]
+    elif span == '+':
+        hands = [(rank, rank) for rank in range(low, 13)] if pair else [(high, rank) for rank in range(low, high)]
+    else:
+        last_high, last_low = _VALUE_NAMES.index(last_first), _VALUE_NAMES.index(last_second)
+        if pair != (last_high == last_low) or not pair and last_high != high:
+            raise ValueError("Can not read '{}' in the range, a span needs hands of the same kind".format(notation))
+        lowest, highest = sorted([low, last_low])
+        hands = [(rank, rank) if pair else (high, rank) for rank in range(lowest, highest + 1)]
+
+    combos = []
+    for high, low in hands:
+        if high == low:
+            combos += starting_hand_combos(high*13 + low)
+        else:
+            if kind != 'o':
+                combos += starting_hand_combos(high*13 + low)
+            if kind != 's':
+                combos += starting_hand_combos(low*13 + high)
+    return combos
@@ -0,0 +1,335 @@
+"""
+Trains a heads-up hold'em strategy with external sampling Monte Carlo counterfactual regret minimization (MCCFR).
+
+The betting follows TexasHold: player 1 acts first on every street with check/call, fold or a raise, where the raise
+sizes are an abstraction given as fractions of the pot. The cards are abstracted into buckets: the 169 starting
+hands before the flop, and the hand strength against all hands the opponent can hold after it. Only the bucket of
+the current street is remembered, which keeps the number of information sets small.
+
+    python cfr.py --iterations 1000000 --processes 8 --checkpoint cfr.npz
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from card_lib import summarize_batch, evaluate_summary_batch, evaluate_batch
+
+# The kinds of nodes in the betting tree
+DECISION, FOLD, SHOWDOWN = 0, 1, 2
+# The actions of a decision node, a raise being stored as the total contribution it raises to
+CHECK_CALL, FOLD_ACTION = -1, -2
+
+_ALL_COMBOS = np.array([(first, second) for first in range(52) for second in range(first + 1, 52)], dtype=np.intp)
+
+
+def starting_hand_indices(holes):
+    """
+    Vectorized starting_hand_index.
+
+    :param holes: An integer array of shape (N, 2) with hole card codes.
+    :return: The index of the starting hand of every row.
+    """
+    ranks, suits = holes % 13, holes // 13
+    high, low = ranks.max(axis=1), ranks.min(axis=1)
+    return np.where(suits[:, 0] == suits[:, 1], high*13 + low, low*13 + high)
+
+
+def hand_strengths(holes, boards):
+    """
+    Computes the hand strength of every player: the share of the hands an opponent can hold that the player beats
+    on the current board, counting ties as half. The hands the opponents can hold are evaluated once per board for
+    all players.
+
+    :param holes: An integer array of shape (N, players, 2) with hole card codes.
+    :param boards: An integer array of shape (N, k) with 3 to 5 board cards.
+    :return: A float array of shape (N, players).
+    """
+    board_summary = summarize_batch(boards)
+    combo_summary = summarize_batch(_ALL_COMBOS)
+    rows, combos = np.nonzero((board_summary[2][:, None] & combo_summary[2]) == 0)
+    opponent = evaluate_summary_batch(board_summary[0][rows] + combo_summary[0][combos],
+                                      board_summary[1][rows] + combo_summary[1][combos],
+                                      board_summary[2][rows] | combo_summary[2][combos])
+    strengths = np.empty(holes.shape[:2])
+    for player in range(holes.shape[1]):
+        hole_summary = summarize_batch(holes[:, player])
+        hero = evaluate_summary_batch(board_summary[0] + hole_summary[0], board_summary[1] + hole_summary[1],
+                                      board_summary[2] | hole_summary[2])
+        # Opponents can not hold a card of the player
+        possible = (hole_summary[2][rows] & combo_summary[2][combos]) == 0
+        beaten = (opponent < hero[rows]) + 0.5*(opponent == hero[rows])
+        strengths[:, player] = np.bincount(rows, beaten*possible, len(holes)) / \
+            np.bincount(rows, possible, len(holes))
+    return strengths
+
+
+def deal_block(rng, count, buckets):
+    """
+    Deals random hands and abstracts them, all at once.
+
+    :param rng: A numpy.random.Generator.
+    :param count: The number of deals.
+    :param buckets: The number of hand strength buckets after the flop.
+    :return: The bucket of both players on all four streets as an array of shape (count, 2, 4), and the showdown
+    result for player 1 (1 win, 0 tie, -1 loss) as an array of shape (count,).
+    """
+    cards = np.argpartition(rng.random((count, 52)), 8, axis=1)[:, :9]
+    holes = cards[:, :4].reshape(count, 2, 2)
+    board = cards[:, 4:9]
+    bucket = np.empty((count, 2, 4), dtype=np.intp)
+    for player in range(2):
+        bucket[:, player, 0] = starting_hand_indices(holes[:, player])
+    for street, board_cards in zip((1, 2, 3), (3, 4, 5)):
+        strength = hand_strengths(holes, board[:, :board_cards])
+        bucket[:, :, street] = np.minimum((strength*buckets).astype(np.intp), buckets - 1)
+    result = np.sign(evaluate_batch(np.hstack([holes[:, 0], board])).astype(np.int64) -
+                     evaluate_batch(np.hstack([holes[:, 1], board])))
+    return bucket, result
+
+
+class CFRTrainer:
+    """
+    The betting tree of the abstraction, and the regrets and strategy sums of every information set in two
+    preallocated float32 arrays with one row per information set and one column per action. The rows of a
+    decision node start at its offset, one row per bucket of its street.
+    """
+    def __init__(self, stack=100, ante=1, bet_sizes=(0.5, 1.0), max_raises=2, all_in=True, buckets=10):
+        """
+        :param stack: The chips every player starts the hand with, including the ante.
+        :param ante: The chips every player puts in the pot before the cards are dealt.
+        :param bet_sizes: The raise sizes as fractions of the pot after calling.
+        :param max_raises: The number of raises allowed per street.
+        :param all_in: Whether going all in is an action of its own.
+        :param buckets: The number of hand strength buckets after the flop.
+        """
+        self.config = {'stack': stack, 'ante': ante, 'bet_sizes': list(bet_sizes), 'max_raises': max_raises,
+                       'all_in': all_in, 'buckets': buckets}
+        self.stack = stack
+        self.bet_sizes = bet_sizes
+        self.max_raises = max_raises
+        self.all_in = all_in
+        self.buckets = buckets
+        self.iterations = 0
+
+        # One entry per node: kind, acting player (the winner for FOLD nodes), street, contributions, offset and
+        # children with the action leading to each
+        self.kind, self.player, self.street, self.contributions = [], [], [], []
+        self.offset, self.children, self.actions = [], [], []
+        self.rows = 0
+        self.root = self._build(0, [ante, ante], 0, 0)
+        self.max_actions = max(len(children) for children in self.children)
+        self.regrets = np.zeros((self.rows, self.max_actions), dtype=np.float32)
+        self.strategy_sum = np.zeros((self.rows, self.max_actions), dtype=np.float32)
+
+    def _node(self, kind, player, street, contributions):
+        self.kind.append(kind)
+        self.player.append(player)
+        self.street.append(street)
+        self.contributions.append(tuple(contributions))
+        self.offset.append(-1)
+        self.children.append([])
+        self.actions.append([])
+        return len(self.kind) - 1
+
+    def _end_street(self, street, contributions):
+        if street == 3 or self.stack in contributions:
+            return self._node(SHOWDOWN, -1, street, contributions)
+        return self._build(street + 1, contributions, 0, 0)
+
+    def _build(self, street, contributions, player, raises, checked=False):
+        """
+        Adds the decision node of player and everything below it.
+
+        :return: The node.
+        """
+        node = self._node(DECISION, player, street, contributions)
+        self.offset[node] = self.rows
+        self.rows += 169 if street == 0 else self.buckets
+        other = 1 - player
+        to_call = contributions[other] - contributions[player]
+        moves = []
+
+        if to_call:
+            moves.append((FOLD_ACTION, self._node(FOLD, other, street, contributions)))
+            called = list(contributions)
+            called[player] = contributions[other]
+            moves.append((CHECK_CALL, self._end_street(street, called)))
+        elif checked:
+            moves.append((CHECK_CALL, self._end_street(street, contributions)))
+        else:
+            moves.append((CHECK_CALL, self._build(street, contributions, other, raises, True)))
+
+        if raises < self.max_raises and contributions[other] < self.stack:
+            pot = sum(contributions) + to_call
+            targets = [contributions[other] + max(1, round(size*pot)) for size in self.bet_sizes]
+            if self.all_in:
+                targets.append(self.stack)
+            for target in sorted({min(target, self.stack) for target in targets}):
+                raised = list(contributions)
+                raised[player] = target
+                moves.append((target, self._build(street, raised, other, raises + 1)))
+        self.actions[node] = [action for action, child in moves]
+        self.children[node] = [child for action, child in moves]
+        return node
+
+    def strategy(self, row, actions):
+        """
+        :return: The current strategy of an information set, by regret matching.
+        """
+        positive = np.maximum(self.regrets[row, :actions], 0)
+        total = positive.sum()
+        return positive / total if total > 0 else np.full(actions, 1 / actions, dtype=np.float32)
+
+    def average_strategy(self, node, bucket):
+        """
+        :param node: A decision node.
+        :param bucket: The bucket of the acting player on the street of the node.
+        :return: The average strategy, the one that converges to an equilibrium, as probabilities of the actions
+        of the node.
+        """
+        actions = len(self.children[node])
+        sums = self.strategy_sum[self.offset[node] + bucket, :actions]
+        total = sums.sum()
+        return sums / total if total > 0 else np.full(actions, 1 / actions, dtype=np.float32)
+
+    def choose(self, node, bucket, rng):
+        """
+        Plays the average strategy, for an opponent that uses the trained strategy.
+
+        :param node: The decision node the player is at.
+        :param bucket: The bucket of the player on the street of the node.
+        :param rng: A numpy.random.Generator.
+        :return: The chosen action (CHECK_CALL, FOLD_ACTION or the contribution raised to) and the node it leads to.
+        """
+        strategy = self.average_strategy(node, bucket)
+        action = min(int(np.searchsorted(np.cumsum(strategy), rng.random() * strategy.sum())), len(strategy) - 1)
+        return self.actions[node][action], self.children[node][action]
+
+    def _traverse(self, node, traverser, buckets, result, rng):
+        kind = self.kind[node]
+        contributions = self.contributions[node]
+        if kind == FOLD:
+            return contributions[1 - traverser] if self.player[node] == traverser else -contributions[traverser]
+        if kind == SHOWDOWN:
+            return contributions[traverser] * (result if traverser == 0 else -result)
+
+        player = self.player[node]
+        children = self.children[node]
+        row = self.offset[node] + buckets[player, self.street[node]]
+        strategy = self.strategy(row, len(children))
+        if player == traverser:
+            values = np.array([self._traverse(child, traverser, buckets, result, rng) for child in children])
+            value = strategy @ values
+            self.regrets[row, :len(children)] += values - value
+            return value
+        # The opponent's strategy is sampled, and added to the average strategy
+        self.strategy_sum[row, :len(children)] += strategy
+        action = min(int(np.searchsorted(np.cumsum(strategy), rng.random() * strategy.sum())), len(children) - 1)
+        return self._traverse(children[action], traverser, buckets, result, rng)
+
+    def run(self, iterations, rng, block=256):
+        """
+        Runs iterations in this process. Every iteration deals one hand and traverses the tree once for every
+        player.
+
+        :param iterations: The number of iterations.
+        :param rng: A numpy.random.Generator.
+        :param block: The number of hands dealt and abstracted at once.
+        """
+        done = 0
+        while done < iterations:
+            buckets, results = deal_block(rng, min(block, iterations - done), self.buckets)
+            for i in range(len(results)):
+                for traverser in range(2):
+                    self._traverse(self.root, traverser, buckets[i], results[i], rng)
+            done += len(results)
+        self.iterations += iterations
+
+    def train(self, iterations, processes=None, round_iterations=1000, checkpoint=None, checkpoint_every=10,
+              seed=None, executor=None):
+        """
+        Trains in rounds. In every round each process runs round_iterations iterations from the current regrets,
+        and the changes of all processes are added together.
+
+        :param iterations: The number of iterations in total.
+        :param processes: The number of worker processes, defaults to the number of cores. 1 runs in this process.
+        :param round_iterations: The number of iterations per process and round.
+        :param checkpoint: A file to save the trainer to, or None.
+        :param checkpoint_every: Save the trainer every this many rounds, and when training is done.
+        :param seed: Seed for numpy.random.SeedSequence, None for a fresh random seed.
+        :param executor: An existing concurrent.futures executor to run the rounds on, instead of starting a pool.
+        """
+        if processes is None:
+            processes = os.cpu_count() or 1
+        seeds = np.random.SeedSequence(seed)
+        pool = None
+        if executor is None and processes > 1:
+            pool = executor = ProcessPoolExecutor(processes)
+        try:
+            rounds = 0
+            while iterations > 0:
+                sizes = [min(round_iterations, iterations - i) for i in range(0, iterations, round_iterations)]
+                sizes = sizes[:processes if executor is not None else 1]
+                round_seeds = seeds.spawn(len(sizes))
+                if executor is None:
+                    self.run(sizes[0], np.random.default_rng(round_seeds[0]))
+                else:
+                    for regrets, strategy_sum in executor.map(_train_round, [self]*len(sizes), sizes, round_seeds):
+                        self.regrets += regrets
+                        self.strategy_sum += strategy_sum
+                    self.iterations += sum(sizes)
+                iterations -= sum(sizes)
+                rounds += 1
+                if checkpoint is not None and (rounds % checkpoint_every == 0 or iterations <= 0):
+                    self.save(checkpoint)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def save(self, path):
+        """
+        Saves the settings, regrets and strategy sums. The file is replaced in one step, so an interrupted save
+        leaves the previous checkpoint intact.
+        """
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as file:
+            np.savez(file, regrets=self.regrets, strategy_sum=self.strategy_sum, iterations=self.iterations,
+                     config=json.dumps(self.config))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :return: The CFRTrainer saved in path, ready to continue training.
+        """
+        with np.load(path) as data:
+            trainer = cls(**json.loads(str(data['config'])))
+            trainer.regrets[:] = data['regrets']
+            trainer.strategy_sum[:] = data['strategy_sum']
+            trainer.iterations = int(data['iterations'])
+        return trainer
+
+
+def _train_round(trainer, iterations, seed):
+    regrets, strategy_sum = trainer.regrets.copy(), trainer.strategy_sum.copy()
+    trainer.run(iterations, np.random.default_rng(seed))
+    return trainer.regrets - regrets, trainer.strategy_sum - strategy_sum
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train a heads-up hold'em strategy with Monte Carlo CFR.")
+    parser.add_argument('--iterations', type=int, default=100000, help="number of iterations")
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--round', type=int, default=1000, help="iterations per process between merges")
+    parser.add_argument('--checkpoint', default='cfr_strategy.npz', help="file to save the trainer to")
+    parser.add_argument('--checkpoint-every', type=int, default=10, help="rounds between checkpoints")
+    parser.add_argument('--resume', action='store_true', help="continue from the checkpoint file")
+    parser.add_argument('--seed', type=int, default=None, help="seed for reproducible training")
+    args = parser.parse_args()
+
+    trainer = CFRTrainer.load(args.checkpoint) if args.resume else CFRTrainer()
+    print("{} decision nodes, {} information sets, {:.1f} MB of regrets and strategy sums".format(
+        trainer.kind.count(DECISION), trainer.rows, (trainer.regrets.nbytes + trainer.strategy_sum.nbytes) / 1e6))
+    trainer.train(args.iterations, args.processes, args.round, args.checkpoint, args.checkpoint_every, args.seed)
+    print("{} iterations in total, saved to {}".format(trainer.iterations, args.checkpoint))
@@ -0,0 +1,122 @@
+"""
+Outs and draw probabilities after the flop or the turn.
+
+    draws = Draws(game.hand1, game.dealer, opponent=game.hand2)
+    draws.outs()            # the cards that improve the hand or change who is ahead
+    draws.hit_by_river      # the chance that the turn or the river is such a card
+    draws = draws.deal(turn_card)
+
+At the flop, the strength of the hand is evaluated for every turn card and every turn and river pair. Dealing the
+turn slices these tables, so nothing is evaluated again.
+"""
+import numpy as np
+from card_lib import STRENGTH_SHIFT, to_codes, ints_to_cards, summarize_codes, summary_strength, \
+    summarize_batch, evaluate_summary_batch
+
+
+def _street_tables(codes, remaining):
+    """
+    :param codes: The hole cards and the board.
+    :param remaining: The codes of the cards that can still be dealt, as an array of length n.
+    :return: The strength now, the strength after every next card with shape (n,) and, if there are two streets
+    to come, the strength after every pair of cards with shape (n, n). The diagonal of the last table is 0.
+    """
+    summary = summarize_codes(codes)
+    cards = summarize_batch(remaining[:, None])
+    now = summary_strength(*summary)
+    next_card = evaluate_summary_batch(summary[0] + cards[0], summary[1] + cards[1], summary[2] | cards[2])
+    if len(codes) >= 6:
+        return now, next_card.astype(np.int64), None
+    first, second = np.triu_indices(len(remaining), 1)
+    both = np.zeros((len(remaining), len(remaining)), dtype=np.int64)
+    both[first, second] = evaluate_summary_batch(summary[0] + cards[0][first] + cards[0][second],
+                                                 summary[1] + cards[1][first] + cards[1][second],
+                                                 summary[2] | cards[2][first] | cards[2][second])
+    both[second, first] = both[first, second]
+    return now, next_card.astype(np.int64), both
+
+
+class Draws:
+    """
+    The outs of a hand after the flop or the turn, and the exact chances of hitting them, optionally against a
+    known opponent hand. A card is an out if it gives the hand a better PokerHandType, or if it changes who is
+    ahead of the opponent.
+    """
+    def __init__(self, hole_cards, board, opponent=None, dead=(), _tables=None):
+        """
+        :param hole_cards: The two hole cards of the player, as a Hand, PlayingCard's or integer codes.
+        :param board: The cards on the table, 3 or 4 of them, for instance TexasHold.dealer.
+        :param opponent: The hole cards of the opponent, or None to only count outs that improve the hand.
+        :param dead: Cards that are known to be out of the deck.
+        """
+        self.hole_cards = to_codes(hole_cards)
+        self.board = to_codes(board)
+        self.opponent = None if opponent is None else to_codes(opponent)
+        self.dead = to_codes(dead)
+        if len(self.board) not in (3, 4):
+            raise ValueError("Draws are computed after the flop or the turn, with 3 or 4 cards on the board")
+        known = self.hole_cards + self.board + (self.opponent or []) + self.dead
+        if len(set(known)) != len(known):
+            raise ValueError("The same card can not be used twice")
+
+        if _tables is None:
+            self.remaining = np.array(sorted(set(range(52)) - set(known)), dtype=np.intp)
+            self.hero = _street_tables(self.hole_cards + self.board, self.remaining)
+            self.villain = None if self.opponent is None else \
+                _street_tables(self.opponent + self.board, self.remaining)
+        else:
+            self.remaining, self.hero, self.villain = _tables
+
+        # Whether every next card is an out, and for two streets to come whether the river is an out after every turn
+        self.out_mask = self._improves(self.hero[0], self.hero[1], self._villain(0), self._villain(1))
+        if self.hero[2] is None:
+            self.hit_next = self.hit_river = self.hit_by_river = self.out_mask.mean()
+        else:
+            river_outs = self._improves(self.hero[1][:, None], self.hero[2], self._villain(1, True), self._villain(2))
+            # Every turn and river pair, as the off-diagonal entries of the table
+            pairs = ~np.eye(len(self.remaining), dtype=bool)
+            # The chance that the next card is an out
+            self.hit_next = self.out_mask.mean()
+            # The chance that the river is an out for the hand as it stands after the turn
+            self.hit_river = river_outs[pairs].mean()
+            # The chance that the turn, the river or both are outs
+            self.hit_by_river = (self.out_mask[:, None] | river_outs)[pairs].mean()
+
+    def _villain(self, street, column=False):
+        if self.villain is None:
+            return None
+        return self.villain[street][:, None] if column else self.villain[street]
+
+    def _improves(self, before, after, villain_before, villain_after):
+        improves = after >> STRENGTH_SHIFT > before >> STRENGTH_SHIFT
+        if villain_before is not None:
+            improves |= np.sign(after - villain_after) != np.sign(before - villain_before)
+        return improves
+
+    def outs(self):
+        """
+        :return: The cards among the ones left in the deck that are outs on the next street, as PlayingCard's.
+        """
+        return ints_to_cards(self.remaining[self.out_mask].tolist())
+
+    def deal(self, card):
+        """
+        Moves on to the next street without evaluating anything again.
+
+        :param card: The turn card, as a PlayingCard or integer code.
+        :return: The Draws after the turn.
+        """
+        code = to_codes([card])[0]
+        if self.hero[2] is None:
+            raise ValueError("The river is the last card to deal")
+        position = np.flatnonzero(self.remaining == code)
+        if len(position) == 0:
+            raise ValueError("The card is not left in the deck")
+        i = position[0]
+        keep = np.arange(len(self.remaining)) != i
+
+        def after_turn(tables):
+            return tables[1][i], tables[2][i][keep], None
+        villain = None if self.villain is None else after_turn(self.villain)
+        tables = (self.remaining[keep], after_turn(self.hero), villain)
+        return Draws(self.hole_cards, self.board + [code], self.opponent, self.dead, tables)
@@ -0,0 +1,331 @@
+from itertools import chain, combinations, permutations
+import numpy as np
+from card_lib import HandRange, to_codes, summarize_batch, evaluate_summary_batch
+from parallel import map_tasks
+
+
+class EquityResult:
+    """
+    The outcome of an equity calculation. All attributes are NumPy arrays with one entry per player.
+    """
+    def __init__(self, wins, ties, equity, samples, evaluated=None):
+        # Fraction of the boards where the player wins alone
+        self.wins = wins
+        # Fraction of the boards where the player shares the pot
+        self.ties = ties
+        # Fraction of the boards where the player loses
+        self.losses = 1 - wins - ties
+        # Share of the pot the player wins on average, counting a tie between k players as 1/k
+        self.equity = equity
+        # The number of boards the figures are based on
+        self.samples = samples
+        # The number of boards that were actually evaluated
+        self.evaluated = samples if evaluated is None else evaluated
+
+    def __str__(self):
+        rows = []
+        for i in range(len(self.equity)):
+            rows.append("Player {}: win {:.4f} tie {:.4f} loss {:.4f} equity {:.4f}".format(
+                i + 1, self.wins[i], self.ties[i], self.losses[i], self.equity[i]))
+        return "\n".join(rows)
+
+
+def prepare_spot(hole_cards, board=(), dead=()):
+    """
+    Checks a spot and converts it to integer codes.
+
+    :param hole_cards: A list with the hole cards of every player, at least two players.
+    :param board: The cards on the table, 0, 3, 4 or 5 of them as in TexasHold.dealer.
+    :param dead: Cards that are known to be out of the deck.
+    :return: The hole cards as an array of shape (players, 2), the board codes and the codes left in the deck.
+    """
+    holes = np.array([to_codes(hole) for hole in hole_cards], dtype=np.intp)
+    board = to_codes(board)
+    dead = to_codes(dead)
+    if holes.ndim != 2 or holes.shape[0] < 2 or holes.shape[1] != 2:
+        raise ValueError("Every player needs exactly two hole cards, and there must be at least two players")
+    if len(board) not in (0, 3, 4, 5):
+        raise ValueError("The board must have 0, 3, 4 or 5 cards")
+    known = holes.ravel().tolist() + board + dead
+    if len(set(known)) != len(known) or not all(0 <= code < 52 for code in known):
+        raise ValueError("The same card can not be used twice")
+    remaining = np.array(sorted(set(range(52)) - set(known)), dtype=np.intp)
+    return holes, board, remaining
+
+
+def showdown_counts(holes, boards, weights=None):
+    """
+    Plays out a batch of complete boards.
+
+    :param holes: The hole card codes as an array of shape (players, 2).
+    :param boards: The board codes as an array of shape (N, 5).
+    :param weights: How many runouts every board stands for, None to count every board once.
+    :return: Per player: the number of boards won alone, the number of boards tied and the pot share won.
+    """
+    board_summary = summarize_batch(boards)
+    hole_summaries = summarize_batch(holes)
+    strengths = np.empty((len(holes), len(boards)), dtype=np.int32)
+    for i in range(len(holes)):
+        strengths[i] = evaluate_summary_batch(board_summary[0] + hole_summaries[0][i],
+                                              board_summary[1] + hole_summaries[1][i],
+                                              board_summary[2] | hole_summaries[2][i])
+    best = strengths == strengths.max(axis=0)
+    winners = best.sum(axis=0)
+    if weights is None:
+        weights = np.ones(len(boards), dtype=np.int64)
+    wins = (best & (winners == 1)) @ weights
+    ties = (best & (winners > 1)) @ weights
+    share = (best / winners) @ weights
+    return wins, ties, share
+
+
+def _sample_chunk(holes, board, remaining, samples, seed):
+    rng = np.random.default_rng(seed)
+    need = 5 - len(board)
+    boards = np.empty((samples, 5), dtype=np.intp)
+    boards[:, :len(board)] = board
+    if need:
+        picks = np.argpartition(rng.random((samples, len(remaining))), need - 1, axis=1)[:, :need]
+        boards[:, len(board):] = remaining[picks]
+    return showdown_counts(holes, boards)
+
+
+def monte_carlo_equity(hole_cards, board=(), dead=(), samples=100000, processes=None, seed=None,
+                       chunk_size=50000, executor=None):
+    """
+    Estimates the equity of every player by dealing random boards from the cards left in a StandardDeck.
+
+    The samples are split in chunks of chunk_size boards, and every chunk gets its own random stream spawned from
+    seed. The result therefore only depends on the seed, not on how many processes do the work.
+
+    :param hole_cards: A list with the two hole cards of every player, as PlayingCard's or integer codes.
+    :param board: The cards on the table, 0, 3, 4 or 5 of them.
+    :param dead: Cards that are known to be out of the deck.
+    :param samples: The number of boards to deal.
+    :param processes: The number of worker processes, see map_tasks.
+    :param seed: Seed for numpy.random.SeedSequence, None for a fresh random seed.
+    :param chunk_size: The number of boards dealt per task.
+    :param executor: An executor to run the chunks on, see map_tasks.
+    :return: An EquityResult.
+    """
+    holes, board, remaining = prepare_spot(hole_cards, board, dead)
+    if len(board) == 5:
+        samples = 1
+    sizes = [chunk_size]*(samples // chunk_size)
+    if samples % chunk_size:
+        sizes.append(samples % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [[holes]*len(sizes), [board]*len(sizes), [remaining]*len(sizes), sizes, seeds]
+
+    results = map_tasks(_sample_chunk, args, processes, executor)
+
+    wins, ties, share = (sum(result[i] for result in results) for i in range(3))
+    return EquityResult(wins / samples, ties / samples, share / samples, samples)
+
+
+def suit_symmetries(holes, board, dead):
+    """
+    Finds the suit permutations that leave the spot unchanged: every player keeps the same hole cards, and the board
+    and the dead cards stay the same. Runouts that such a permutation maps onto each other have the same outcome.
+
+    :param holes: The hole card codes as an array of shape (players, 2).
+    :param board: The board codes.
+    :param dead: The dead card codes.
+    :return: A list of arrays of length 52 which map every card code to its permuted code.
+    """
+    groups = [set(hole) for hole in holes.tolist()] + [set(board), set(dead)]
+    symmetries = []
+    for suits in permutations(range(4)):
+        mapping = np.array([suits[code // 13]*13 + code % 13 for code in range(52)], dtype=np.intp)
+        if all({int(mapping[code]) for code in group} == group for group in groups):
+            symmetries.append(mapping)
+    return symmetries
+
+
+def canonical_runouts(runouts, symmetries):
+    """
+    Collapses runouts that are the same up to a suit symmetry.
+
+    :param runouts: The runout codes as an array of shape (N, k).
+    :param symmetries: Code mappings as returned by suit_symmetries.
+    :return: One runout of every class as an array of shape (M, k), and the number of runouts in every class.
+    """
+    one = np.uint64(1)
+    keys = None
+    for mapping in symmetries:
+        masks = np.bitwise_or.reduce(one << mapping[runouts].astype(np.uint64), axis=1)
+        keys = masks if keys is None else np.minimum(keys, masks)
+    _, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    return runouts[first], counts
+
+
+def _enumerate_chunk(holes, board, runouts, weights):
+    boards = np.empty((len(runouts), 5), dtype=np.intp)
+    boards[:, :len(board)] = board
+    boards[:, len(board):] = runouts
+    return showdown_counts(holes, boards, weights)
+
+
+def exact_equity(hole_cards, board=(), dead=(), processes=None, chunk_size=50000, executor=None):
+    """
+    Computes the exact equity of every player by going through every possible runout of the board.
+
+    Runouts that only differ by a suit permutation leaving the spot unchanged (see suit_symmetries) are evaluated
+    once and counted with the size of their class, and the remaining runouts are split in chunks that are evaluated
+    in parallel.
+
+    :param hole_cards: A list with the two hole cards of every player, as PlayingCard's or integer codes.
+    :param board: The cards on the table, 0, 3, 4 or 5 of them.
+    :param dead: Cards that are known to be out of the deck.
+    :param processes: The number of worker processes, see map_tasks.
+    :param chunk_size: The number of runouts evaluated per task.
+    :param executor: An executor to run the chunks on, see map_tasks.
+    :return: An EquityResult where samples is the number of runouts and evaluated the number of evaluated runouts.
+    """
+    holes, board, remaining = prepare_spot(hole_cards, board, dead)
+    need = 5 - len(board)
+    if need:
+        runouts = np.fromiter(chain.from_iterable(combinations(remaining.tolist(), need)), dtype=np.intp)
+        runouts = runouts.reshape(-1, need)
+    else:
+        runouts = np.empty((1, 0), dtype=np.intp)
+    total = len(runouts)
+    runouts, weights = canonical_runouts(runouts, suit_symmetries(holes, board, to_codes(dead)))
+
+    starts = range(0, len(runouts), chunk_size)
+    args = [[holes]*len(starts), [board]*len(starts),
+            [runouts[i:i + chunk_size] for i in starts], [weights[i:i + chunk_size] for i in starts]]
+    results = map_tasks(_enumerate_chunk, args, processes, executor)
+
+    wins, ties, share = (sum(result[i] for result in results) for i in range(3))
+    return EquityResult(wins / total, ties / total, share / total, total, len(runouts))
+
+
+def _weight_sums(groups, strengths, weights, query_groups, query_strengths):
+    """
+    Sums weights within groups with one sort and a few binary searches.
+
+    :param groups: The group of every entry, as an int64 array.
+    :param strengths: The strength of every entry.
+    :param weights: The weight of every entry.
+    :param query_groups: The group of every query.
+    :param query_strengths: The strength of every query.
+    :return: Per query, the weight of the entries in its group with a lower strength, with the same strength and
+    in total.
+    """
+    keys = groups << 32 | strengths
+    order = np.argsort(keys)
+    keys = keys[order]
+    cumulative = np.concatenate([[0.0], np.cumsum(weights[order])])
+    start = cumulative[np.searchsorted(keys, query_groups << 32)]
+    below = cumulative[np.searchsorted(keys, query_groups << 32 | query_strengths)]
+    up_to = cumulative[np.searchsorted(keys, query_groups << 32 | query_strengths, side='right')]
+    end = cumulative[np.searchsorted(keys, (query_groups + 1) << 32)]
+    return below - start, up_to - below, end - start
+
+
+def _range_chunk(combos1, weights1, combos2, weights2, boards):
+    # Every combination of either range is evaluated once on every board, from the summaries of the board
+    combos, inverse = np.unique(np.vstack([combos1, combos2]), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    board_summary = summarize_batch(boards)
+    combo_summary = summarize_batch(combos)
+    # Combinations that share a card with the board can not be dealt, and are not evaluated
+    free = (board_summary[2][:, None] & combo_summary[2]) == 0
+    board_rows, combo_rows = np.nonzero(free)
+    strengths = np.zeros((len(boards), len(combos)), dtype=np.int64)
+    strengths[board_rows, combo_rows] = evaluate_summary_batch(
+        board_summary[0][board_rows] + combo_summary[0][combo_rows],
+        board_summary[1][board_rows] + combo_summary[1][combo_rows],
+        board_summary[2][board_rows] | combo_summary[2][combo_rows])
+    strengths1, strengths2 = strengths[:, inverse[:len(combos1)]], strengths[:, inverse[len(combos1):]]
+    board_weights1 = np.where(free[:, inverse[:len(combos1)]], weights1, 0.0)
+    board_weights2 = np.where(free[:, inverse[len(combos1):]], weights2, 0.0)
+
+    # The combinations of range 2 are put in a group per board with all of them, and in a group per board and card
+    # with the ones holding that card. The hands a combination of range 1 beats are those it beats in the first
+    # group, less those holding one of its cards. The combination with both its cards was subtracted twice from the
+    # ties and the total, and is added back once.
+    rows = np.arange(len(boards), dtype=np.int64)[:, None]
+    groups2 = np.concatenate([np.broadcast_to(rows*53 + 52, strengths2.shape).ravel(),
+                              (rows*53 + combos2[:, 0]).ravel(), (rows*53 + combos2[:, 1]).ravel()])
+    sums = [_weight_sums(groups2, np.tile(strengths2.ravel(), 3), np.tile(board_weights2.ravel(), 3),
+                         np.broadcast_to(group, strengths1.shape).ravel(), strengths1.ravel())
+            for group in (rows*53 + 52, rows*53 + combos1[:, 0], rows*53 + combos1[:, 1])]
+    below, equal, total = (everyone - first - second for everyone, first, second in zip(*sums))
+
+    index2 = {combo: i for i, combo in enumerate(map(tuple, combos2.tolist()))}
+    same = np.array([index2.get(combo, -1) for combo in map(tuple, combos1.tolist())], dtype=np.intp)
+    same_weights = np.where(same >= 0, board_weights2[:, same], 0.0).ravel()
+    equal += same_weights
+    total += same_weights
+
+    board_weights1 = board_weights1.ravel()
+    return board_weights1 @ below, board_weights1 @ equal, board_weights1 @ total
+
+
+def range_equity(range1, range2, board=(), dead=(), samples=None, seed=None, processes=None, chunk_size=2000,
+                 executor=None):
+    """
+    Computes the equity of one range of hole cards against another. Every pair of combinations is weighted with
+    the product of their weights, and pairs that share a card with each other, the board, the runout or the dead
+    cards are left out.
+
+    Every board is evaluated once for all combinations of both ranges, and the pairs are summed by sorting the
+    combinations of range 2 by strength, so the work grows with the number of combinations, not of pairs.
+
+    :param range1: A HandRange, or a range in the notation of HandRange.parse.
+    :param range2: A HandRange, or a range in the notation of HandRange.parse.
+    :param board: The cards on the table, 0, 3, 4 or 5 of them.
+    :param dead: Cards that are known to be out of the deck.
+    :param samples: The number of random runouts to deal, None to go through every runout.
+    :param seed: Seed for numpy.random.default_rng when dealing random runouts.
+    :param processes: The number of worker processes, see map_tasks.
+    :param chunk_size: The number of boards evaluated per task.
+    :param executor: An executor to run the chunks on, see map_tasks.
+    :return: An EquityResult with range 1 as player 1 and range 2 as player 2.
+    """
+    if isinstance(range1, str):
+        range1 = HandRange.parse(range1)
+    if isinstance(range2, str):
+        range2 = HandRange.parse(range2)
+    board, dead = to_codes(board), to_codes(dead)
+    if len(board) not in (0, 3, 4, 5):
+        raise ValueError("The board must have 0, 3, 4 or 5 cards")
+    known = board + dead
+    if len(set(known)) != len(known) or not all(0 <= code < 52 for code in known):
+        raise ValueError("The same card can not be used twice")
+    combos1, weights1 = range1.combos(known)
+    combos2, weights2 = range2.combos(known)
+    remaining = np.array(sorted(set(range(52)) - set(known)), dtype=np.intp)
+
+    need = 5 - len(board)
+    if samples is None:
+        if need:
+            runouts = np.fromiter(chain.from_iterable(combinations(remaining.tolist(), need)), dtype=np.intp)
+            runouts = runouts.reshape(-1, need)
+        else:
+            runouts = np.empty((1, 0), dtype=np.intp)
+    else:
+        rng = np.random.default_rng(seed)
+        picks = np.argpartition(rng.random((samples, len(remaining))), max(need - 1, 0), axis=1)[:, :need]
+        runouts = remaining[picks]
+    boards = np.empty((len(runouts), 5), dtype=np.intp)
+    boards[:, :len(board)] = board
+    boards[:, len(board):] = runouts
+
+    starts = range(0, len(boards), chunk_size)
+    args = [[combos1]*len(starts), [weights1]*len(starts), [combos2]*len(starts), [weights2]*len(starts),
+            [boards[i:i + chunk_size] for i in starts]]
+    if len(combos1) == 0 or len(combos2) == 0:
+        results = []
+    else:
+        results = map_tasks(_range_chunk, args, processes, executor)
+
+    wins, ties, total = (sum(result[i] for result in results) for i in range(3))
+    if not total:
+        raise ValueError("The ranges have no combinations left that can be dealt together")
+    wins, ties = wins / total, ties / total
+    losses = 1 - wins - ties
+    return EquityResult(np.array([wins, losses]), np.array([ties, ties]),
+                        np.array([wins + ties/2, losses + ties/2]), len(boards))
@@ -0,0 +1,165 @@
+"""
+A compact binary log of the hands played by TexasHoldEngine.
+
+The file starts with a small header followed by fixed-width records of RECORD_TYPE, 16 bytes each. Cards are stored
+in their integer form (see card_lib.card_to_int), so a log can be mapped into memory and used as a NumPy array
+without any parsing:
+
+    with HandHistoryWriter('hands.log') as history:
+        game = TexasHoldEngine(history=history)
+        ...
+    records = load_hand_history('hands.log')
+    flops = records[records['kind'] == RecordKind.board]
+"""
+import os
+from enum import IntEnum
+import numpy as np
+
+HISTORY_MAGIC = b'HHST'
+HISTORY_VERSION = 1
+# Card slots and the player of records that do not use them hold this value
+NO_CARD = 255
+NO_PLAYER = 255
+
+_HISTORY_HEADER = np.dtype([('magic', 'S4'), ('version', '<u4')])
+RECORD_TYPE = np.dtype([('hand', '<u4'), ('amount', '<i4'), ('kind', 'u1'), ('player', 'u1'), ('count', 'u1'),
+                        ('cards', 'u1', (5,))])
+
+
+class RecordKind(IntEnum):
+    # The two hole cards of player
+    hole_cards = 0
+    # The card burnt before a street is dealt
+    burn = 1
+    # The flop, the turn or the river, count cards
+    board = 2
+    check = 3
+    # amount is the number of chips called
+    call = 4
+    # amount is the bet size chosen for the raise
+    raise_bet = 5
+    fold = 6
+    # One record per player who shows their cards at showdown
+    showdown = 7
+    # One record per player who wins or shares the pot at showdown, amount is the number of chips the player won
+    win = 8
+
+
+class HandHistoryWriter:
+    """
+    Appends records to a hand-history file. Records are collected in a preallocated buffer and written in one call
+    whenever the buffer is full, when flush is called and when the writer is closed.
+    """
+    def __init__(self, path, buffer_size=4096):
+        """
+        :param path: The file to append to. It is created if it does not exist.
+        :param buffer_size: The number of records kept in memory before they are written.
+        """
+        self.path = path
+        self.buffer = np.zeros(buffer_size, dtype=RECORD_TYPE)
+        self.buffered = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(np.array([(HISTORY_MAGIC, HISTORY_VERSION)], dtype=_HISTORY_HEADER).tobytes())
+            self.hand = -1
+        else:
+            # Continue the hand numbers of the hands already in the file
+            records = load_hand_history(path)
+            self.hand = int(records['hand'][-1]) if len(records) else -1
+            # Drop a record that was only partly written, so the new records stay aligned
+            self.file.truncate(_HISTORY_HEADER.itemsize + len(records)*RECORD_TYPE.itemsize)
+            del records
+
+    def start_hand(self):
+        """
+        Starts a new hand. The records that follow belong to it.
+
+        :return: The number of the new hand.
+        """
+        self.hand += 1
+        return self.hand
+
+    def record(self, kind, player=NO_PLAYER, cards=(), amount=0):
+        """
+        Adds a record to the current hand.
+
+        :param kind: The RecordKind of the record.
+        :param player: The index of the player, NO_PLAYER for records that are not about one player.
+        :param cards: Up to five integer card codes.
+        :param amount: The number of chips, see RecordKind.
+        """
+        if self.buffered == len(self.buffer):
+            self.flush()
+        record = self.buffer[self.buffered]
+        record['hand'] = self.hand
+        record['amount'] = amount
+        record['kind'] = kind
+        record['player'] = player
+        record['count'] = len(cards)
+        record['cards'] = tuple(cards) + (NO_CARD,)*(5 - len(cards))
+        self.buffered += 1
+
+    def flush(self):
+        """
+        Writes the buffered records to the file.
+        """
+        if self.buffered:
+            self.file.write(self.buffer[:self.buffered].tobytes())
+            self.buffered = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_hand_history(path):
+    """
+    Maps a hand-history file into memory. Nothing is read until the records are used, so even very large logs can
+    be scanned or filtered with NumPy without loading them.
+
+    :param path: The file written by HandHistoryWriter.
+    :return: A read-only array of RECORD_TYPE with all complete records in the file.
+    """
+    header = np.fromfile(path, dtype=_HISTORY_HEADER, count=1)
+    if len(header) == 0 or header['magic'][0] != HISTORY_MAGIC:
+        raise ValueError("{} is not a hand-history file".format(path))
+    if header['version'][0] != HISTORY_VERSION:
+        raise ValueError("{} has version {}, expected {}".format(path, header['version'][0], HISTORY_VERSION))
+    count = (os.path.getsize(path) - _HISTORY_HEADER.itemsize) // RECORD_TYPE.itemsize
+    if count == 0:
+        # A memory map can not be empty
+        return np.zeros(0, dtype=RECORD_TYPE)
+    return np.memmap(path, dtype=RECORD_TYPE, mode='r', offset=_HISTORY_HEADER.itemsize, shape=(count,))
+
+
+def hand_starts(records):
+    """
+    :param records: Records as returned by load_hand_history, or a slice of them.
+    :return: The index of the first record of every hand, followed by the number of records.
+    """
+    hands = np.asarray(records['hand'])
+    starts = np.flatnonzero(hands[1:] != hands[:-1]) + 1
+    return np.concatenate([[0], starts, [len(hands)]]) if len(hands) else np.zeros(1, dtype=np.intp)
+
+
+def iter_hands(records):
+    """
+    Goes through the hands of a log one at a time.
+
+    :param records: Records as returned by load_hand_history.
+    :return: A generator of (hand number, records of the hand).
+    """
+    starts = hand_starts(records)
+    for start, end in zip(starts[:-1], starts[1:]):
+        yield int(records['hand'][start]), records[start:end]
@@ -0,0 +1,233 @@
+from card_lib import StandardDeck, Hand, Board
+from showdown import split_pot
+
+
+class TexasHoldEngine:
+    """
+    The betting and dealing rules of a heads-up Texas hold'em game, without any dependency on Qt. The GUI wraps
+    this class in TexasHold, which turns the hook methods (totals_changed, turn_changed and game_over) into signals.
+
+    With a HandHistoryWriter, every deal, burn, action and showdown is recorded, see hand_history.
+    """
+    def __init__(self, player1="Player 1", player2="Player 2", money1=1000, money2=1000, rng=None, mode=None,
+                 history=None):
+        """
+        :param player1: The name of the first player.
+        :param player2: The name of the second player.
+        :param money1: The starting stack of the first player.
+        :param money2: The starting stack of the second player.
+        :param rng: The random generator of the deck, see StandardDeck.
+        :param mode: The EvaluatorMode used at showdown, None for the mode chosen in card_lib.
+        :param history: A HandHistoryWriter that records the game, or None.
+        """
+        self.players = [player1, player2]
+        self.money = [money1, money2]
+        self.bet = 0
+        self.pot = 0
+        # The stacks of both players, followed by the bet size chosen with set_bet_size
+        self.total = self.money + [0]
+        self.which_player = 0
+        self.player2_has_raised = 0
+        self.game_winner = None
+        self.mode = mode
+        self.history = history
+
+        self.deck = StandardDeck(rng)
+        self.deck.shuffle()
+
+        self.hand1 = self.new_hand()
+        self.hand2 = self.new_hand()
+        self.dealer = self.new_board()
+        self.deal_hole_cards()
+
+    def new_hand(self):
+        """
+        :return: The object holding the cards of a player, a Hand unless overridden.
+        """
+        return Hand()
+
+    def new_board(self):
+        """
+        :return: The object holding the cards on the table, a Board unless overridden.
+        """
+        return Board()
+
+    def totals_changed(self):
+        """
+        Called whenever the stacks, the pot, the bet or the active player has changed.
+        """
+        pass
+
+    def turn_changed(self):
+        """
+        Called whenever another player is to act, or a new street or round has started.
+        """
+        pass
+
+    def game_over(self, text):
+        """
+        Called when one of the players has run out of money.
+
+        :param text: A message announcing the winner.
+        """
+        pass
+
+    def record(self, kind, player=None, cards=(), amount=0):
+        """
+        Adds a record to the hand history, if there is one. See HandHistoryWriter.record.
+
+        :param kind: The name of the RecordKind of the record.
+        :param player: The index of the player, None for records that are not about one player.
+        """
+        if self.history is not None:
+            # hand_history needs NumPy, so it is only imported by games that keep a history
+            from hand_history import RecordKind, NO_PLAYER
+            self.history.record(RecordKind[kind], NO_PLAYER if player is None else player, cards, amount)
+
+    def deal_hole_cards(self):
+        """
+        Deals two cards to each player, one at a time.
+        """
+        self.hand1.add_card(self.deck.take_top())
+        self.hand2.add_card(self.deck.take_top())
+        self.hand1.add_card(self.deck.take_top())
+        self.hand2.add_card(self.deck.take_top())
+        if self.history is not None:
+            self.history.start_hand()
+            self.record('hole_cards', 0, self.hand1.codes())
+            self.record('hole_cards', 1, self.hand2.codes())
+
+    def check_call(self):
+        """
+        The active player checks, or calls the raise of the other player.
+        """
+        if self.which_player == 0:       # if player1 active
+            if self.player2_has_raised == 1:
+                self.record('call', 0, amount=self.bet)
+                self.player2_has_raised = 0
+                self.total[0] -= self.bet
+                self.pot += self.bet
+                self.new_deal()
+            else:
+                self.record('check', 0)
+                self.change_player()
+            self.totals_changed()
+        else:
+            self.record('call' if self.bet else 'check', 1, amount=self.bet)
+            self.total[1] -= self.bet
+            self.pot += self.bet
+            self.new_deal()
+
+    def fold(self):
+        """
+        The active player folds, and the other player takes the pot.
+        """
+        self.record('fold', self.which_player)
+        self.total[not self.which_player] += self.pot
+        self.check_winner_game()
+        self.totals_changed()
+        self.new_round()
+
+    def raise_bet(self):
+        """
+        The active player bets or raises to the amount chosen with set_bet_size.
+        """
+        self.record('raise_bet', self.which_player, amount=self.total[2])
+        if self.which_player == 0:
+            self.bet = self.total[2]
+            self.total[0] -= self.bet
+            self.pot += self.bet
+        else:
+            # The amount covers the bet of player 1, who only has to call the difference
+            self.bet = self.total[2]-self.bet
+            self.total[1] -= self.total[2]
+            self.pot += self.total[2]
+            self.player2_has_raised = 1
+        self.change_player()
+
+    def set_bet_size(self, value):
+        """
+        :param value: The amount the active player bets or raises to with raise_bet.
+        """
+        self.total[2] = value
+        self.totals_changed()
+
+    def change_player(self):
+        """
+        Gives the turn to the other player.
+        """
+        self.which_player = 0 if self.which_player else 1
+        self.turn_changed()
+        self.totals_changed()
+
+    def new_deal(self):
+        """
+        Ends the betting on the current street: deals the flop, the turn or the river, or goes to showdown after
+        the river and starts a new round.
+        """
+        self.bet = 0
+        if len(self.dealer) == 0:
+            self.record('burn', cards=[self.deck.burn()])
+            cards = self.deck.take_n(3)
+            self.record('board', cards=[card.code for card in cards])
+            for card in cards:
+                self.dealer.add_card(card)
+            self.which_player = 0
+            self.turn_changed()
+        elif 0 < len(self.dealer) < 5:
+            self.record('burn', cards=[self.deck.burn()])
+            card = self.deck.take_top()
+            self.record('board', cards=[card.code])
+            self.dealer.add_card(card)
+            self.which_player = 0
+            self.turn_changed()
+        else:
+            self.winner_round()
+            self.check_winner_game()
+            self.new_round()
+        self.totals_changed()
+
+    def new_round(self):
+        """
+        Collects the cards, shuffles the deck and deals new hole cards.
+        """
+        self.pot = 0
+        self.bet = 0
+        self.deck.reset()
+        self.deck.shuffle()
+        self.which_player = 0
+        self.player2_has_raised = 0
+        self.turn_changed()
+        self.dealer.clear()
+        self.hand1.clear()
+        self.hand2.clear()
+        self.deal_hole_cards()
+
+    def winner_round(self):
+        """
+        Compares the hands of the players at showdown and gives them the pot.
+        """
+        best_hand1 = self.hand1.best_poker_hand(self.dealer, self.mode)
+        best_hand2 = self.hand2.best_poker_hand(self.dealer, self.mode)
+        best = max(best_hand1, best_hand2)
+        # A split pot gives the odd chip to player 1, who acts first
+        payouts = split_pot(self.pot, [best_hand1 == best, best_hand2 == best], button=1)
+        self.record('showdown', 0)
+        self.record('showdown', 1)
+        for player, hand in enumerate([best_hand1, best_hand2]):
+            if hand == best:
+                self.record('win', player, amount=payouts[player])
+        self.total[0] += payouts[0]
+        self.total[1] += payouts[1]
+        self.pot = 0
+
+    def check_winner_game(self):
+        """
+        Ends the game if one of the players has run out of money.
+        """
+        if self.total[0] == 0:
+            self.game_winner = 1
+            self.game_over(self.players[1] + " won!")
+        elif self.total[1] == 0:
+            self.game_winner = 0
+            self.game_over(self.players[0] + " won!")
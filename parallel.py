@@ -0,0 +1,30 @@
+"""
+Runs independent tasks on a pool of worker processes, for the equity, replay and tournament functions.
+
+    results = map_tasks(_sample_chunk, [holes, boards, sizes], processes=8)
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def map_tasks(function, args, processes=None, executor=None):
+    """
+    Calls function once per task and collects the results in order, like map(function, *args).
+
+    :param function: A module-level function, so it can be sent to worker processes.
+    :param args: A list with one sequence per parameter of function, each with one entry per task.
+    :param processes: The number of worker processes, defaults to the number of cores. 1 runs in this process, and
+    so does a single task.
+    :param executor: An existing concurrent.futures executor to run the tasks on, instead of starting a new pool,
+    for instance SharedTables.executor.
+    :return: A list with the result of every task.
+    """
+    tasks = len(args[0]) if args else 0
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if executor is not None:
+        return list(executor.map(function, *args))
+    if processes == 1 or tasks <= 1:
+        return list(map(function, *args))
+    with ProcessPoolExecutor(min(processes, tasks)) as pool:
+        return list(pool.map(function, *args))
@@ -0,0 +1,106 @@
+"""
+Generates the preflop equity tables read by card_lib.load_preflop_tables.
+
+    python preflop_tables.py --samples 20000 --output tables/preflop_equity.bin
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from card_lib import PREFLOP_TABLE_PATH, PREFLOP_MAX_PLAYERS, evaluate_batch, starting_hand_combos, \
+    write_preflop_tables
+
+
+def _deal(rng, known, count):
+    """
+    Deals count random cards per row, in random order, avoiding the known cards of that row.
+
+    :param rng: A numpy.random.Generator.
+    :param known: An array of shape (N, k) with the codes that are already dealt in every row.
+    :param count: The number of cards to deal per row.
+    :return: An array of shape (N, count) with the dealt codes.
+    """
+    keys = rng.random((len(known), 52))
+    np.put_along_axis(keys, known, 2.0, axis=1)
+    dealt = np.argpartition(keys, count - 1, axis=1)[:, :count]
+    order = np.argsort(np.take_along_axis(keys, dealt, axis=1), axis=1)
+    return np.take_along_axis(dealt, order, axis=1)
+
+
+def _head_to_head_row(hand, samples, seed):
+    """
+    :return: The equity of the starting hand against every starting hand with a higher index.
+    """
+    rng = np.random.default_rng(seed)
+    combos = np.array(starting_hand_combos(hand))
+    row = np.full(169, np.nan)
+    row[hand] = 0.5
+    for other in range(hand + 1, 169):
+        other_combos = np.array(starting_hand_combos(other))
+        first = combos[rng.integers(len(combos), size=samples)]
+        second = other_combos[rng.integers(len(other_combos), size=samples)]
+        # Redraw the pairs of combos that share a card, which keeps the pairs uniform
+        clash = (first[:, :, None] == second[:, None, :]).any(axis=(1, 2))
+        while clash.any():
+            first[clash] = combos[rng.integers(len(combos), size=clash.sum())]
+            second[clash] = other_combos[rng.integers(len(other_combos), size=clash.sum())]
+            clash = (first[:, :, None] == second[:, None, :]).any(axis=(1, 2))
+        board = _deal(rng, np.hstack([first, second]), 5)
+        strength1 = evaluate_batch(np.hstack([first, board]))
+        strength2 = evaluate_batch(np.hstack([second, board]))
+        row[other] = np.mean((strength1 > strength2) + 0.5*(strength1 == strength2))
+    return row
+
+
+def _vs_random_column(hand, samples, seed):
+    """
+    :return: The equity of the starting hand against 1 to PREFLOP_MAX_PLAYERS-1 random hands.
+    """
+    rng = np.random.default_rng(seed)
+    combos = np.array(starting_hand_combos(hand))
+    column = np.empty(PREFLOP_MAX_PLAYERS - 1)
+    for players in range(2, PREFLOP_MAX_PLAYERS + 1):
+        hero = combos[rng.integers(len(combos), size=samples)]
+        dealt = _deal(rng, hero, 2*(players - 1) + 5)
+        board = dealt[:, -5:]
+        strength = evaluate_batch(np.hstack([hero, board]))
+        others = np.array([evaluate_batch(np.hstack([dealt[:, 2*opponent:2*opponent + 2], board]))
+                           for opponent in range(players - 1)])
+        best_other = others.max(axis=0)
+        ties = (others == strength).sum(axis=0)
+        share = np.where(strength > best_other, 1.0, np.where(strength == best_other, 1/(ties + 1), 0.0))
+        column[players - 2] = share.mean()
+    return column
+
+
+def generate_preflop_tables(samples=10000, processes=None, seed=None):
+    """
+    Estimates the preflop equity tables by dealing random boards.
+
+    :param samples: The number of boards dealt for every matchup.
+    :param processes: The number of worker processes, defaults to the number of cores.
+    :param seed: Seed for numpy.random.SeedSequence, None for a fresh random seed.
+    :return: The head-to-head table with shape (169, 169) and the table against random hands with shape
+    (PREFLOP_MAX_PLAYERS-1, 169).
+    """
+    seeds = np.random.SeedSequence(seed).spawn(2*169)
+    hands = list(range(169))
+    with ProcessPoolExecutor(processes or os.cpu_count() or 1) as pool:
+        rows = list(pool.map(_head_to_head_row, hands, [samples]*169, seeds[:169]))
+        columns = list(pool.map(_vs_random_column, hands, [samples]*169, seeds[169:]))
+
+    head_to_head = np.array(rows)
+    # The lower triangle follows from the upper one, as the two equities of a matchup add up to one
+    lower = np.tril_indices(169, -1)
+    head_to_head[lower] = 1 - head_to_head.T[lower]
+    return head_to_head, np.array(columns).T
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate the preflop equity tables used by card_lib.")
+    parser.add_argument('--output', default=PREFLOP_TABLE_PATH, help="the file to write")
+    parser.add_argument('--samples', type=int, default=10000, help="boards dealt per matchup")
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--seed', type=int, default=None, help="seed for reproducible tables")
+    args = parser.parse_args()
+    write_preflop_tables(args.output, *generate_preflop_tables(args.samples, args.processes, args.seed))
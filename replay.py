@@ -0,0 +1,153 @@
+"""
+Replays the showdowns of hand-history logs through the card_lib evaluator and reports every hand where the
+evaluator picks other winners than the ones recorded.
+
+    python replay.py hands-2024-05-01.log hands-2024-05-02.log --processes 8
+
+The script exits with status 1 if any hand differs.
+"""
+import argparse
+import sys
+import numpy as np
+from card_lib import evaluate_batch
+from hand_history import RecordKind, NO_CARD, load_hand_history
+from parallel import map_tasks
+
+
+class ReplayResult:
+    """
+    The outcome of replaying a log.
+    """
+    def __init__(self, hands, mismatches):
+        # The number of showdowns that were replayed
+        self.hands = hands
+        # A list of (hand number, recorded winners, evaluator winners), the winners as lists of player indices
+        self.mismatches = mismatches
+
+    def __str__(self):
+        rows = ["{} showdowns replayed, {} differ".format(self.hands, len(self.mismatches))]
+        for hand, recorded, evaluated in self.mismatches:
+            rows.append("hand {}: recorded winners {}, evaluator winners {}".format(hand, recorded, evaluated))
+        return "\n".join(rows)
+
+
+def replay_records(records):
+    """
+    Rebuilds the hole cards and the board of every showdown in the records, evaluates all hands in one batch and
+    compares the winners with the recorded ones.
+
+    :param records: Records as returned by load_hand_history, holding complete hands.
+    :return: A ReplayResult.
+    """
+    kind = np.asarray(records['kind'])
+    hand = np.asarray(records['hand'], dtype=np.int64)
+    player = np.asarray(records['player'], dtype=np.intp)
+    hands = np.unique(hand[kind == RecordKind.showdown])
+    if len(hands) == 0:
+        return ReplayResult(0, [])
+
+    # Only the records of hands that went to showdown are used, and hand numbers are mapped to rows
+    used = np.isin(hand, hands)
+    row = np.searchsorted(hands, hand)
+    holes_at = used & (kind == RecordKind.hole_cards)
+    players = int(player[holes_at].max()) + 1
+
+    holes = np.zeros((len(hands), players, 2), dtype=np.intp)
+    holes[row[holes_at], player[holes_at]] = records['cards'][holes_at][:, :2]
+    shown = np.zeros((len(hands), players), dtype=bool)
+    shown_at = used & (kind == RecordKind.showdown)
+    shown[row[shown_at], player[shown_at]] = True
+    recorded = np.zeros((len(hands), players), dtype=bool)
+    win_at = used & (kind == RecordKind.win)
+    recorded[row[win_at], player[win_at]] = True
+
+    # The flop, turn and river records of a hand follow each other, so their cards are the board in order
+    board_at = used & (kind == RecordKind.board)
+    cards = records['cards'][board_at]
+    dealt = cards != NO_CARD
+    board_row = np.repeat(row[board_at], dealt.sum(axis=1))
+    position = np.arange(len(board_row)) - np.searchsorted(board_row, board_row)
+    boards = np.zeros((len(hands), 5), dtype=np.intp)
+    boards[board_row, position] = cards[dealt]
+
+    strengths = np.empty((len(hands), players), dtype=np.int64)
+    for i in range(players):
+        strengths[:, i] = evaluate_batch(np.hstack([holes[:, i], boards]))
+    strengths[~shown] = -1
+    evaluated = shown & (strengths == strengths.max(axis=1)[:, None])
+
+    mismatches = []
+    for i in np.flatnonzero((evaluated != recorded).any(axis=1)):
+        mismatches.append((int(hands[i]), np.flatnonzero(recorded[i]).tolist(),
+                           np.flatnonzero(evaluated[i]).tolist()))
+    return ReplayResult(len(hands), mismatches)
+
+
+def _replay_chunk(path, start, end):
+    return replay_records(load_hand_history(path)[start:end])
+
+
+def replay_chunks(path, chunk_size):
+    """
+    Splits a log in chunks of about chunk_size records that do not split a hand. As hand numbers never decrease in
+    a log, the boundaries are found by binary search and only a few pages of the log are read.
+
+    :param path: The log file.
+    :param chunk_size: The number of records per chunk.
+    :return: A list of (start, end) record indices.
+    """
+    records = load_hand_history(path)
+    bounds = [0]
+    while bounds[-1] < len(records):
+        end = bounds[-1] + chunk_size
+        if end >= len(records):
+            end = len(records)
+        else:
+            end = int(np.searchsorted(records['hand'], records['hand'][end], side='left'))
+            if end <= bounds[-1]:
+                # A single hand longer than a chunk
+                end = int(np.searchsorted(records['hand'], records['hand'][bounds[-1]], side='right'))
+        bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def replay(paths, processes=None, chunk_size=1 << 20, executor=None):
+    """
+    Replays the showdowns of one or more logs. Every worker maps the log itself, so only the record indices of a
+    chunk are sent to it.
+
+    :param paths: A log file or a list of log files.
+    :param processes: The number of worker processes, see map_tasks.
+    :param chunk_size: The number of records replayed per task.
+    :param executor: An executor to run the chunks on, see map_tasks.
+    :return: A list with a ReplayResult per log.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    chunks = [replay_chunks(path, chunk_size) for path in paths]
+    tasks = [(path, start, end) for path, bounds in zip(paths, chunks) for start, end in bounds]
+    args = list(zip(*tasks)) or [[], [], []]
+    results = map_tasks(_replay_chunk, args, processes, executor)
+
+    totals = []
+    for bounds in chunks:
+        parts, results = results[:len(bounds)], results[len(bounds):]
+        totals.append(ReplayResult(sum(part.hands for part in parts),
+                                   [mismatch for part in parts for mismatch in part.mismatches]))
+    return totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-score the showdowns of hand-history logs with card_lib.")
+    parser.add_argument('paths', nargs='+', help="the logs to replay")
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--chunk-size', type=int, default=1 << 20, help="records replayed per task")
+    args = parser.parse_args()
+
+    differ = False
+    for path, result in zip(args.paths, replay(args.paths, args.processes, args.chunk_size)):
+        print(path)
+        print(result)
+        differ = differ or bool(result.mismatches)
+    if differ:
+        sys.exit(1)
@@ -0,0 +1,126 @@
+"""
+Publishes read-only NumPy tables to worker processes through shared memory, so a pool of workers holds one copy of
+the evaluator tables instead of one per process and the workers do not build them at startup.
+
+    with SharedTables.publish_card_lib() as tables:
+        with tables.executor(64) as pool:
+            result = monte_carlo_equity(hole_cards, samples=10**8, executor=pool)
+
+The process that publishes the tables owns the shared memory block and removes it when the SharedTables is closed,
+garbage collected or the process exits. Workers only map it. The preflop tables need no publishing, as
+load_preflop_tables maps its file and all processes share the pages of the file.
+"""
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from card_lib import lookup_arrays, install_lookup_arrays
+
+# Every array starts at a multiple of this many bytes
+_ALIGNMENT = 64
+
+# The shared memory blocks this process has attached to, by name, kept open as long as the process lives
+_attached = {}
+
+
+def _release(memory):
+    try:
+        memory.close()
+    except BufferError:
+        # Views of the block are still in use in this process. The mapping goes away with them.
+        pass
+    memory.unlink()
+
+
+class SharedTables:
+    """
+    Named NumPy arrays copied into one shared memory block. The spec describes the block, and is all a worker
+    needs to attach to it.
+    """
+    def __init__(self, arrays):
+        """
+        :param arrays: A dictionary with the arrays to publish by name.
+        """
+        layout = []
+        offset = 0
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset += array.nbytes
+        self.memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        # Removes the block even if close is never called
+        self._finalizer = weakref.finalize(self, _release, self.memory)
+        for (name, dtype, shape, start), array in zip(layout, arrays.values()):
+            np.ndarray(shape, dtype, self.memory.buf, start)[...] = array
+        # The name of the block and the name, dtype, shape and offset of every array
+        self.spec = (self.memory.name, layout)
+
+    @classmethod
+    def publish_card_lib(cls, extra=None):
+        """
+        Publishes the lookup tables of the card_lib batch evaluator, building them first if needed.
+
+        :param extra: A dictionary with more arrays to publish, for instance card abstraction buckets.
+        :return: A SharedTables.
+        """
+        arrays = lookup_arrays()
+        arrays.update(extra or {})
+        return cls(arrays)
+
+    def executor(self, processes=None):
+        """
+        :param processes: The number of worker processes, defaults to the number of cores.
+        :return: A ProcessPoolExecutor whose workers evaluate with the published card_lib tables.
+        """
+        return ProcessPoolExecutor(processes, initializer=attach_card_lib, initargs=(self.spec,))
+
+    def close(self):
+        """
+        Removes the shared memory block. Workers that are attached keep their mapping until they exit.
+        """
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def attach(spec):
+    """
+    Maps a block published by SharedTables into this process, without copying.
+
+    :param spec: The SharedTables.spec of the block.
+    :return: A dictionary with read-only views of the arrays by name.
+    """
+    name, layout = spec
+    if name not in _attached:
+        try:
+            # The publishing process owns the block, so it must not be tracked and removed when this one exits
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 the block is always tracked. Pool workers share the tracker of the process that
+            # started them, where the block is already registered by its owner.
+            memory = shared_memory.SharedMemory(name=name)
+        arrays = {}
+        for array_name, dtype, shape, offset in layout:
+            array = np.ndarray(shape, dtype, memory.buf, offset)
+            array.flags.writeable = False
+            arrays[array_name] = array
+        _attached[name] = memory, arrays
+    return _attached[name][1]
+
+
+def attach_card_lib(spec):
+    """
+    Attaches to a block published with SharedTables.publish_card_lib and makes card_lib evaluate with its tables.
+    Meant as the initializer of pool workers, see SharedTables.executor.
+
+    :param spec: The SharedTables.spec of the block.
+    :return: A dictionary with read-only views of the arrays by name.
+    """
+    arrays = attach(spec)
+    install_lookup_arrays(arrays)
+    return arrays
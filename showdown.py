@@ -0,0 +1,102 @@
+# NumPy is only imported when one of the functions is called, see card_lib._lazy_import
+from card_lib import np
+
+
+def split_pot(amount, winners, button=0):
+    """
+    Splits a pot between the winners in whole chips. The chips that can not be split evenly go one each to the
+    winners closest to the left of the button.
+
+    :param amount: The number of chips in the pot.
+    :param winners: A list of booleans, True for every seat that shares the pot.
+    :param button: The seat of the button.
+    :return: A list with the number of chips every seat gets.
+    """
+    seats = [seat for seat, won in enumerate(winners) if won]
+    share, odd_chips = divmod(amount, len(seats))
+    seats.sort(key=lambda seat: (seat - button - 1) % len(winners))
+    payouts = [0]*len(winners)
+    for i, seat in enumerate(seats):
+        payouts[seat] = share + (i < odd_chips)
+    return payouts
+
+
+def rank_players(strengths, folded=None):
+    """
+    Ranks the players of many tables at once.
+
+    :param strengths: An integer array of shape (tables, players) with the strength of every hand.
+    :param folded: A boolean array of the same shape, True for players who folded. Folded players rank last.
+    :return: An array of the same shape where 0 is the best hand at the table. Equal hands get the same rank.
+    """
+    strengths = np.asarray(strengths, dtype=np.int64)
+    if folded is not None:
+        strengths = np.where(folded, -1, strengths)
+    # The rank of a hand is the number of different hands that beat it
+    ordered = -np.sort(-strengths, axis=1)
+    distinct = np.concatenate([np.ones((len(ordered), 1), dtype=bool), ordered[:, 1:] != ordered[:, :-1]], axis=1)
+    distinct_ranks = np.cumsum(distinct, axis=1) - 1
+    positions = np.argsort(-strengths, axis=1, kind='stable')
+    ranks = np.empty_like(distinct_ranks)
+    np.put_along_axis(ranks, positions, distinct_ranks, axis=1)
+    return ranks
+
+
+def settle_pots(strengths, contributions, folded=None, button=0):
+    """
+    Settles the pots of many tables at once, including side pots when players are all-in for different amounts.
+
+    The chips are split in layers at every distinct contribution. A layer is won by the best hand among the players
+    who have not folded and contributed at least up to that layer. Chips that no remaining player has matched go to
+    the remaining players who contributed the most. Pots that are split evenly give their odd chips one each to the
+    winners closest to the left of the button.
+
+    :param strengths: An integer array of shape (tables, players) with the strength of every hand.
+    :param contributions: An integer array of the same shape with the chips every player put in the pot.
+    :param folded: A boolean array of the same shape, True for players who folded. None if nobody folded.
+    :param button: The seat of the button, one for all tables or an array with one seat per table.
+    :return: An int64 array of the same shape with the chips every player wins.
+    """
+    strengths = np.atleast_2d(np.asarray(strengths, dtype=np.int64))
+    contributions = np.atleast_2d(np.asarray(contributions, dtype=np.int64))
+    tables, players = contributions.shape
+    live = np.ones((tables, players), dtype=bool) if folded is None else ~np.atleast_2d(np.asarray(folded))
+    button = np.broadcast_to(np.asarray(button), (tables,))
+
+    # Seats in the order they receive odd chips, starting left of the button
+    seats = np.arange(players)
+    chip_order = np.argsort((seats[None, :] - button[:, None] - 1) % players, axis=1)
+
+    best_live_contribution = np.where(live, contributions, 0).max(axis=1)
+    levels = np.sort(contributions, axis=1)
+    payouts = np.zeros((tables, players), dtype=np.int64)
+    previous = np.zeros(tables, dtype=np.int64)
+    for k in range(players):
+        level = levels[:, k]
+        pot = (np.minimum(contributions, level[:, None]) - np.minimum(contributions, previous[:, None])).sum(axis=1)
+        eligible = live & (contributions >= np.minimum(level, best_live_contribution)[:, None])
+        eligible_strengths = np.where(eligible, strengths, np.iinfo(np.int64).min)
+        winners = eligible & (eligible_strengths == eligible_strengths.max(axis=1)[:, None])
+        count = np.maximum(winners.sum(axis=1), 1)
+        share, odd_chips = np.divmod(pot, count)
+        # Number every winner in chip order, and give the first odd_chips of them one chip extra
+        ordered_winners = np.take_along_axis(winners, chip_order, axis=1)
+        order = np.empty((tables, players), dtype=np.int64)
+        np.put_along_axis(order, chip_order, np.cumsum(ordered_winners, axis=1) - 1, axis=1)
+        payouts += winners * (share[:, None] + (order < odd_chips[:, None]))
+        previous = level
+    return payouts
+
+
+def resolve_showdown(strengths, contributions, folded=None, button=0):
+    """
+    Settles the pot of a single table, see settle_pots.
+
+    :param strengths: The strength of every player's hand, for instance PokerHand.strength.
+    :param contributions: The chips every player put in the pot.
+    :param folded: A list of booleans, True for players who folded. None if nobody folded.
+    :param button: The seat of the button.
+    :return: A list with the chips every player wins.
+    """
+    folded = None if folded is None else [folded]
+    return settle_pots([strengths], [contributions], folded, button)[0].tolist()
@@ -0,0 +1,378 @@
+"""
+Hosts many heads-up tables in one asyncio event loop. Clients connect over TCP or a Unix socket and talk in JSON
+lines:
+
+    -> {"type": "join", "name": "Alice"}                   join the next free seat, or "table": id for a given table
+    <- {"type": "joined", "table": 7, "seat": 0}
+    <- {"type": "hole", "cards": [51, 50]}                 the client's own hole cards, as integer card codes
+    <- {"type": "state", "actions": 3, "pot": 40}          the fields that changed since the last state
+    -> {"type": "action", "action": "raise", "amount": 40}  or "check_call" and "fold"
+    <- {"type": "error", "message": "Invalid raise amount"}  the amount is outside the "raise_to" range of the state
+    <- {"type": "showdown", "hands": [[..], [..]], "board": [..]}
+    <- {"type": "game_over", "winner": 0, "text": "Alice won!"}
+
+A player who does not act within the action timeout checks if possible and folds otherwise. Messages are queued
+per connection and written once per pass of the event loop, so a busy table costs one write per client and pass.
+
+    python table_server.py --unix /tmp/holdem.sock
+    python table_server.py --port 9000 --bots 2000 --timeout 1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from holdem_engine import TexasHoldEngine
+
+
+def _encode(message):
+    return json.dumps(message, separators=(',', ':')) + '\n'
+
+
+class ServerTable(TexasHoldEngine):
+    """
+    A TexasHoldEngine played by two connections. After every action, publish compares the state with the one the
+    players last got and sends them the fields that changed.
+    """
+    def __init__(self, server, table_id, connections, stack, rng=None):
+        """
+        :param server: The TableServer hosting the table.
+        :param table_id: The number of the table.
+        :param connections: The Connection of both players, the first one in seat 0.
+        :param stack: The starting stack of both players.
+        :param rng: The random generator of the deck, see StandardDeck.
+        """
+        self.server = server
+        self.table_id = table_id
+        self.connections = connections
+        self.sent = {}
+        self.holes = [None, None]
+        self.timer = None
+        self.actions = 0
+        self.finished = False
+        super().__init__(connections[0].name, connections[1].name, stack, stack, rng=rng)
+
+    def game_over(self, text):
+        self.finished = True
+        self.broadcast({'type': 'game_over', 'winner': self.game_winner, 'text': text})
+
+    def winner_round(self):
+        # Both hands are shown before new_round collects the cards
+        self.broadcast({'type': 'showdown', 'hands': [self.hand1.codes(), self.hand2.codes()],
+                        'board': self.dealer.codes()})
+        super().winner_round()
+
+    def broadcast(self, message):
+        for connection in self.connections:
+            if connection is not None:
+                connection.send(message)
+
+    def facing_bet(self):
+        """
+        :return: True if the active player has to call a bet, and can not check.
+        """
+        return bool(self.player2_has_raised) if self.which_player == 0 else self.bet > 0
+
+    def raise_bounds(self):
+        """
+        :return: The smallest and the largest amount the active player can raise to, the range of the slider in the
+        GUI, or None if the player can only call.
+        """
+        if self.which_player == 0:
+            if self.player2_has_raised:
+                return None
+            return [1, min(self.total[0:2])]
+        return [max(self.bet, 1), min(self.bet + self.total[0], self.total[1])]
+
+    def publish(self):
+        """
+        Sends new hole cards to their owners and the changed parts of the state to both players, and starts the
+        timer of the active player.
+        """
+        for seat, hand in enumerate([self.hand1, self.hand2]):
+            codes = hand.codes()
+            if codes != self.holes[seat] and self.connections[seat] is not None:
+                self.holes[seat] = codes
+                self.connections[seat].send({'type': 'hole', 'cards': codes})
+        # The number of actions changes every time, so every action is answered with a state message
+        state = {'actions': self.actions, 'stacks': self.total[:2], 'pot': self.pot, 'bet': self.bet,
+                 'turn': self.which_player, 'board': self.dealer.codes(), 'raise_to': self.raise_bounds()}
+        delta = {key: value for key, value in state.items() if self.sent.get(key) != value}
+        if delta:
+            self.sent.update(delta)
+            delta['type'] = 'state'
+            self.broadcast(delta)
+        if self.timer is not None:
+            self.timer.cancel()
+        if not self.finished:
+            self.timer = self.server.loop.call_later(self.server.action_timeout, self.timed_out, self.actions)
+
+    def timed_out(self, actions):
+        if actions == self.actions and not self.finished:
+            self.act(self.which_player, {'action': 'fold' if self.facing_bet() else 'check_call'})
+
+    def act(self, seat, message):
+        """
+        Plays an action message of the player in seat.
+        """
+        if self.finished:
+            return self.connections[seat].send({'type': 'error', 'message': "The game is over"})
+        if seat != self.which_player:
+            return self.connections[seat].send({'type': 'error', 'message': "It is not your turn"})
+        action = message.get('action')
+        if action == 'check_call':
+            self.check_call()
+        elif action == 'fold':
+            self.fold()
+        elif action == 'raise':
+            amount = message.get('amount')
+            bounds = self.raise_bounds()
+            if type(amount) != int or bounds is None or not bounds[0] <= amount <= bounds[1]:
+                return self.connections[seat].send({'type': 'error', 'message': "Invalid raise amount"})
+            self.set_bet_size(amount)
+            self.raise_bet()
+        else:
+            return self.connections[seat].send({'type': 'error', 'message': "Unknown action"})
+        self.actions += 1
+        self.publish()
+
+    def leave(self, seat):
+        """
+        Removes a player who disconnected. The other player wins the game.
+        """
+        self.connections[seat] = None
+        if not self.finished:
+            self.game_winner = 1 - seat
+            self.game_over(self.players[1 - seat] + " won!")
+        if self.timer is not None:
+            self.timer.cancel()
+
+
+class Connection:
+    """
+    One client of the server, with the messages waiting to be written to it.
+    """
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.outbox = []
+        self.name = None
+        self.table = None
+        self.seat = None
+
+    def send(self, message):
+        if not self.outbox:
+            self.server.schedule_flush(self)
+        self.outbox.append(message)
+
+
+class TableServer:
+    """
+    Seats connecting clients in pairs at ServerTable's, and runs all tables in one event loop.
+    """
+    def __init__(self, stack=1000, action_timeout=30.0, seed=None, max_buffer=1 << 20):
+        """
+        :param stack: The starting stack of every player.
+        :param action_timeout: The seconds a player has to act.
+        :param seed: Seed for the decks of the tables, None for random decks.
+        :param max_buffer: Clients with more bytes than this waiting to be sent are disconnected.
+        """
+        self.stack = stack
+        self.action_timeout = action_timeout
+        self.random = random.Random(seed)
+        self.max_buffer = max_buffer
+        self.loop = None
+        self.tables = {}
+        self.next_table = 0
+        # Players waiting for an opponent, by table number
+        self.waiting = {}
+        self.pending = []
+
+    async def start(self, host=None, port=None, path=None):
+        """
+        Starts listening, on a Unix socket if path is given and on TCP otherwise.
+
+        :return: The asyncio server.
+        """
+        self.loop = asyncio.get_running_loop()
+        # A long queue of pending connections, so thousands of clients can connect at once
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path, backlog=4096)
+        return await asyncio.start_server(self.handle, host, port, backlog=4096)
+
+    def schedule_flush(self, connection):
+        if not self.pending:
+            self.loop.call_soon(self.flush)
+        self.pending.append(connection)
+
+    def flush(self):
+        """
+        Writes the queued messages of every connection in one write per connection.
+        """
+        pending, self.pending = self.pending, []
+        for connection in pending:
+            data = ''.join(map(_encode, connection.outbox)).encode()
+            connection.outbox.clear()
+            if connection.writer.is_closing():
+                continue
+            connection.writer.write(data)
+            if connection.writer.transport.get_write_buffer_size() > self.max_buffer:
+                # A client that does not read its messages would make the server buffer without limit
+                connection.writer.close()
+
+    async def handle(self, reader, writer):
+        connection = Connection(self, reader, writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    connection.send({'type': 'error', 'message': "Messages must be JSON"})
+                    continue
+                if not isinstance(message, dict):
+                    connection.send({'type': 'error', 'message': "Messages must be JSON objects"})
+                elif message.get('type') == 'join':
+                    self.join(connection, message)
+                elif message.get('type') == 'action' and connection.table is not None:
+                    connection.table.act(connection.seat, message)
+                else:
+                    connection.send({'type': 'error', 'message': "Unexpected message"})
+        except ConnectionError:
+            pass
+        finally:
+            self.disconnect(connection)
+            writer.close()
+
+    def join(self, connection, message):
+        """
+        Seats a client at the table in the message, or at the first table waiting for an opponent. A table starts
+        as soon as both seats are taken.
+        """
+        if connection.table is not None or connection in self.waiting.values():
+            return connection.send({'type': 'error', 'message': "Already joined"})
+        table_id = message.get('table')
+        if table_id is not None and type(table_id) != int:
+            return connection.send({'type': 'error', 'message': "Invalid table"})
+        connection.name = str(message.get('name', 'Player'))
+        if table_id is None:
+            table_id = next(iter(self.waiting), None)
+        elif table_id in self.tables:
+            return connection.send({'type': 'error', 'message': "The table is full"})
+        if table_id is None:
+            while self.next_table in self.tables or self.next_table in self.waiting:
+                self.next_table += 1
+            table_id = self.next_table
+        if table_id not in self.waiting:
+            self.waiting[table_id] = connection
+            return connection.send({'type': 'joined', 'table': table_id, 'seat': 0})
+
+        first = self.waiting.pop(table_id)
+        connection.send({'type': 'joined', 'table': table_id, 'seat': 1})
+        table = ServerTable(self, table_id, [first, connection], self.stack, self.random.getrandbits(64))
+        self.tables[table_id] = table
+        for seat, player in enumerate([first, connection]):
+            player.table, player.seat = table, seat
+        table.publish()
+
+    def disconnect(self, connection):
+        for table_id, waiting in list(self.waiting.items()):
+            if waiting is connection:
+                del self.waiting[table_id]
+        table = connection.table
+        if table is not None:
+            table.leave(connection.seat)
+            if all(player is None for player in table.connections):
+                del self.tables[table.table_id]
+
+
+async def run_bot(name, host=None, port=None, path=None, hands=20, seed=None):
+    """
+    A client that joins a table and plays random actions, for testing the server.
+
+    :param name: The name of the player.
+    :param host: The host of a TCP server.
+    :param port: The port of a TCP server.
+    :param path: The path of a Unix socket server, used instead of host and port if given.
+    :param hands: The number of hands the bot plays before it leaves.
+    :param seed: Seed for the actions of the bot.
+    :return: A list with the seconds from every action until the server's answer arrived.
+    """
+    rng = random.Random(seed)
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write(_encode({'type': 'join', 'name': name}).encode())
+    seat, state, played = None, {}, 0
+    sent_at, latencies = None, []
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if sent_at is not None:
+                latencies.append(time.perf_counter() - sent_at)
+                sent_at = None
+            message = json.loads(line)
+            kind = message.pop('type')
+            if kind == 'joined':
+                seat = message['seat']
+            elif kind == 'hole':
+                played += 1
+                if played > hands:
+                    break
+            elif kind == 'game_over':
+                break
+            elif kind == 'state':
+                state.update(message)
+                if state.get('turn') == seat:
+                    choice = rng.random()
+                    bounds = state['raise_to']
+                    if choice < 0.1:
+                        action = {'type': 'action', 'action': 'fold'}
+                    elif choice < 0.25 and bounds is not None and bounds[0] <= bounds[1]:
+                        amount = rng.randint(bounds[0], min(bounds[1], bounds[0] + 50))
+                        action = {'type': 'action', 'action': 'raise', 'amount': amount}
+                    else:
+                        action = {'type': 'action', 'action': 'check_call'}
+                    writer.write(_encode(action).encode())
+                    sent_at = time.perf_counter()
+    finally:
+        writer.close()
+    return latencies
+
+
+async def _serve(args):
+    server = TableServer(action_timeout=args.timeout, seed=args.seed)
+    listener = await server.start(args.host, args.port, args.unix)
+    if not args.bots:
+        async with listener:
+            await listener.serve_forever()
+    start = time.perf_counter()
+    bots = [run_bot("Bot {}".format(i), args.host, args.port, args.unix, args.hands, i) for i in range(args.bots)]
+    results = await asyncio.gather(*bots)
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for result in results for latency in result)
+    listener.close()
+    print("{} bots at {} tables, {} actions in {:.2f} s, {:.0f} actions/s".format(
+        args.bots, args.bots // 2, len(latencies), elapsed, len(latencies) / elapsed))
+    if latencies:
+        print("latency: median {:.2f} ms, 99th percentile {:.2f} ms".format(
+            1000*latencies[len(latencies)//2], 1000*latencies[int(len(latencies)*0.99)]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Host heads-up Texas hold'em tables over TCP or a Unix socket.")
+    parser.add_argument('--host', default='127.0.0.1', help="TCP host to listen on")
+    parser.add_argument('--port', type=int, default=9000, help="TCP port to listen on")
+    parser.add_argument('--unix', default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--timeout', type=float, default=30.0, help="seconds a player has to act")
+    parser.add_argument('--seed', type=int, default=None, help="seed for reproducible decks")
+    parser.add_argument('--bots', type=int, default=0, help="play this many local bots against each other and exit")
+    parser.add_argument('--hands', type=int, default=20, help="hands every bot plays")
+    args = parser.parse_args()
+    asyncio.run(_serve(args))
@@ -0,0 +1,99 @@
+import itertools
+import random
+import numpy as np
+import pytest
+from card_lib import PokerHandType, STRENGTH_SHIFT, Hand, HandRange, make_strength, lookup_strength_codes, \
+    evaluate_batch, shuffled_decks
+
+
+def _five_card_strength(codes):
+    """
+    Evaluates exactly five cards the plain way, independently of the lookup tables.
+    """
+    values = sorted((code % 13 + 2 for code in codes), reverse=True)
+    flush = len({code // 13 for code in codes}) == 1
+    distinct = sorted(set(values), reverse=True)
+    straight_high = 0
+    if len(distinct) == 5:
+        if distinct[0] - distinct[4] == 4:
+            straight_high = distinct[0]
+        elif distinct == [14, 5, 4, 3, 2]:
+            straight_high = 5
+    # The values ordered by how often they appear, then by value
+    groups = sorted(((values.count(value), value) for value in distinct), reverse=True)
+    counts = [count for count, _ in groups]
+    ordered = [value for _, value in groups]
+    if straight_high and flush:
+        return make_strength(PokerHandType.straight_flush, [straight_high])
+    if counts[0] == 4:
+        return make_strength(PokerHandType.four_of_a_kind, ordered)
+    if counts == [3, 2]:
+        return make_strength(PokerHandType.full_house, ordered)
+    if flush:
+        return make_strength(PokerHandType.flush, values)
+    if straight_high:
+        return make_strength(PokerHandType.straight, [straight_high])
+    if counts[0] == 3:
+        return make_strength(PokerHandType.three_of_a_kind, ordered)
+    if counts == [2, 2, 1]:
+        return make_strength(PokerHandType.two_pair, ordered)
+    if counts[0] == 2:
+        return make_strength(PokerHandType.pair, ordered)
+    return make_strength(PokerHandType.high_card, values)
+
+
+def brute_force_strength(codes):
+    return max(_five_card_strength(five) for five in itertools.combinations(codes, 5))
+
+
+def _codes(text):
+    """
+    :param text: Cards such as 'Ah 5d', with the suits named as in card codes: clubs, diamonds, spades, hearts.
+    """
+    return ['23456789TJQKA'.index(card[0]) + 13*'cdsh'.index(card[1]) for card in text.split()]
+
+
+@pytest.mark.parametrize('cards', [5, 6, 7])
+def test_random_hands_match_brute_force(cards):
+    rng = random.Random(cards)
+    hands = [rng.sample(range(52), cards) for _ in range(2000)]
+    expected = [brute_force_strength(hand) for hand in hands]
+    assert [lookup_strength_codes(hand) for hand in hands] == expected
+    assert evaluate_batch(np.array(hands)).tolist() == expected
+
+
+@pytest.mark.parametrize('text, hand_type, values', [
+    ('Ah 2d 3c 4s 5h', PokerHandType.straight, [5]),
+    ('Ah 2d 3c 4s 5h 6c Kd', PokerHandType.straight, [6]),
+    ('Ac 2c 3c 4c 5c', PokerHandType.straight_flush, [5]),
+    ('Ac 2c 3c 4c 5c 6c 7c', PokerHandType.straight_flush, [7]),
+    ('Th Jh Qh Kh Ah 9h 8h', PokerHandType.straight_flush, [14]),
+    ('Ac 2c 3c 4c 5d 6c Kc', PokerHandType.flush, [14, 13, 6, 4, 3]),
+    ('Qs Ks Ad 2h 3c', PokerHandType.high_card, [14, 13, 12, 3, 2]),
+    ('9d Td Jd Qd Kd Ah As', PokerHandType.straight_flush, [13]),
+    ('Ah Ad Ac As Kh Kd Kc', PokerHandType.four_of_a_kind, [14, 13]),
+    ('Kh Kd Kc Qs Qh Qd 2c', PokerHandType.full_house, [13, 12]),
+])
+def test_edge_cases(text, hand_type, values):
+    codes = _codes(text)
+    strength = lookup_strength_codes(codes)
+    assert strength == make_strength(hand_type, values) == brute_force_strength(codes)
+    assert strength >> STRENGTH_SHIFT == hand_type
+    assert evaluate_batch(np.array([codes]))[0] == strength
+
+
+def test_hand_accepts_numpy_codes():
+    hand = Hand()
+    for code in shuffled_decks(1, 0)[0][:2]:
+        hand.add_card(code)
+    combos, _ = HandRange.parse('AKs').combos()
+    hand.add_card(combos[0][0])
+    assert hand.codes() == [int(code) for code in shuffled_decks(1, 0)[0][:2]] + [int(combos[0][0])]
+    with pytest.raises(TypeError):
+        hand.add_card(np.int64(52))
+
+
+@pytest.mark.parametrize('codes', [[0, 0, 0, 0, 0, 1, 2], [0, 0, 5, 6, 7], [52, 1, 2, 3, 4], [-1, 1, 2, 3, 4]])
+def test_invalid_hands_raise(codes):
+    with pytest.raises(ValueError):
+        evaluate_batch(np.array([[8, 9, 10, 11, 12], codes]))
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from card_lib import STRENGTH_SHIFT, lookup_strength_codes
+from draws import Draws
+
+
+def _improves(before, after, villain_before, villain_after):
+    if after >> STRENGTH_SHIFT > before >> STRENGTH_SHIFT:
+        return True
+    return villain_before is not None and np.sign(after - villain_after) != np.sign(before - villain_before)
+
+
+def brute_force(hole_cards, board, opponent=None):
+    """
+    :return: The outs, hit_next, hit_river and hit_by_river, from one lookup_strength_codes call per runout.
+    """
+    known = hole_cards + board + (opponent or [])
+    remaining = [code for code in range(52) if code not in known]
+
+    def strengths(cards):
+        hero = lookup_strength_codes(hole_cards + board + cards)
+        return hero, None if opponent is None else lookup_strength_codes(opponent + board + cards)
+
+    now = strengths([])
+    is_out = {}
+    for card in remaining:
+        after = strengths([card])
+        is_out[card] = _improves(now[0], after[0], now[1], after[1])
+    outs = [card for card in remaining if is_out[card]]
+    hit_next = len(outs) / len(remaining)
+    if len(board) == 4:
+        return outs, hit_next, hit_next, hit_next
+    river_hits = by_river_hits = pairs = 0
+    for turn in remaining:
+        after_turn = strengths([turn])
+        for river in remaining:
+            if river == turn:
+                continue
+            after_river = strengths([turn, river])
+            river_out = _improves(after_turn[0], after_river[0], after_turn[1], after_river[1])
+            river_hits += river_out
+            by_river_hits += river_out or is_out[turn]
+            pairs += 1
+    return outs, hit_next, river_hits / pairs, by_river_hits / pairs
+
+
+SPOTS = [
+    # A flush draw with two overcards against a set
+    ([51, 50], [40, 43, 0], [1, 14]),
+    # An open-ended straight flush draw against an overpair
+    ([7, 8], [6, 9, 13], [24, 37]),
+    # A set against a flush draw, on the turn
+    ([5, 18], [31, 20, 21, 45], [23, 24]),
+    # Aces up against a smaller two pair with a straight draw, on the turn
+    ([12, 25], [0, 13, 40, 2], [3, 16]),
+]
+
+
+@pytest.mark.parametrize('hole_cards, board, opponent', SPOTS)
+@pytest.mark.parametrize('with_opponent', [False, True])
+def test_draws_match_brute_force(hole_cards, board, opponent, with_opponent):
+    opponent = opponent if with_opponent else None
+    draws = Draws(hole_cards, board, opponent)
+    outs, hit_next, hit_river, hit_by_river = brute_force(hole_cards, board, opponent)
+    assert [card.code for card in draws.outs()] == outs
+    assert draws.hit_next == pytest.approx(hit_next)
+    assert draws.hit_river == pytest.approx(hit_river)
+    assert draws.hit_by_river == pytest.approx(hit_by_river)
+
+
+@pytest.mark.parametrize('hole_cards, board, opponent', SPOTS[:2])
+@pytest.mark.parametrize('with_opponent', [False, True])
+def test_deal_matches_a_turn_board(hole_cards, board, opponent, with_opponent):
+    opponent = opponent if with_opponent else None
+    flop = Draws(hole_cards, board, opponent)
+    for turn in (flop.remaining[0], flop.remaining[-1]):
+        dealt = flop.deal(int(turn))
+        direct = Draws(hole_cards, board + [int(turn)], opponent)
+        assert dealt.board == direct.board
+        assert (dealt.remaining == direct.remaining).all()
+        assert (dealt.out_mask == direct.out_mask).all()
+        assert (dealt.hit_next, dealt.hit_river, dealt.hit_by_river) == \
+            (direct.hit_next, direct.hit_river, direct.hit_by_river)
+    with pytest.raises(ValueError):
+        flop.deal(int(flop.remaining[0])).deal(int(flop.remaining[1]))
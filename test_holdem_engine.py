@@ -0,0 +1,31 @@
+from holdem_engine import TexasHoldEngine
+
+
+def test_reraise_puts_the_whole_amount_in_the_pot():
+    game = TexasHoldEngine(money1=1000, money2=1000, rng=0)
+    game.set_bet_size(40)
+    game.raise_bet()
+    # The second player calls the 40 and raises 60 more
+    game.set_bet_size(100)
+    game.raise_bet()
+    assert game.pot == 140 and game.total[:2] == [960, 900]
+    assert game.bet == 60 and game.player2_has_raised
+    game.check_call()
+    assert game.pot == 200 and game.total[:2] == [900, 900]
+    assert len(game.dealer) == 3
+
+
+def test_chips_are_kept_through_a_hand():
+    game = TexasHoldEngine(money1=500, money2=700, rng=1)
+    for amount in (30, 80):
+        game.set_bet_size(amount)
+        game.raise_bet()
+    game.check_call()
+    while len(game.dealer) < 5:
+        assert sum(game.total[:2]) + game.pot == 1200
+        game.check_call()
+        game.check_call()
+    # Checking down the river goes to showdown, which pays out the whole pot
+    game.check_call()
+    game.check_call()
+    assert game.pot == 0 and sum(game.total[:2]) == 1200
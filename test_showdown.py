@@ -0,0 +1,39 @@
+from showdown import split_pot, rank_players, settle_pots, resolve_showdown
+
+
+def test_side_pots_are_layered():
+    # The best hand is all-in for 100, so it only wins the main pot of 300
+    assert resolve_showdown([3, 2, 1], [100, 300, 300]) == [300, 400, 0]
+    assert resolve_showdown([3, 2, 1], [50, 100, 300]) == [150, 100, 200]
+
+
+def test_unmatched_chips_return_to_the_biggest_contributor():
+    assert resolve_showdown([3, 2, 1], [100, 100, 300]) == [300, 0, 200]
+
+
+def test_folded_overcontributor():
+    # The chips a folded player put in beyond the live players go to the winner, not back to the folded player
+    assert resolve_showdown([9, 2, 1], [300, 100, 100], folded=[True, False, False]) == [0, 500, 0]
+    assert resolve_showdown([9, 2, 1], [300, 100, 50], folded=[True, False, False]) == [0, 450, 0]
+
+
+def test_odd_chips_go_left_of_the_button():
+    assert resolve_showdown([5, 1, 5], [10, 1, 10], folded=[False, True, False], button=0) == [10, 0, 11]
+    assert resolve_showdown([5, 1, 5], [10, 1, 10], folded=[False, True, False], button=2) == [11, 0, 10]
+    assert split_pot(5, [True, False, True], button=0) == [2, 0, 3]
+    assert split_pot(5, [True, False, True], button=2) == [3, 0, 2]
+    assert split_pot(7, [True, True, True, True], button=1) == [2, 1, 2, 2]
+
+
+def test_tables_are_settled_independently():
+    strengths = [[3, 2, 1], [3, 2, 1], [5, 1, 5]]
+    contributions = [[100, 300, 300], [100, 100, 300], [10, 1, 10]]
+    folded = [[False]*3, [False]*3, [False, True, False]]
+    payouts = settle_pots(strengths, contributions, folded, button=[0, 0, 2])
+    assert payouts.tolist() == [[300, 400, 0], [300, 0, 200], [11, 0, 10]]
+    assert (payouts.sum(axis=1) == [700, 500, 21]).all()
+
+
+def test_rank_players():
+    assert rank_players([[7, 9, 7, 1]]).tolist() == [[1, 0, 1, 2]]
+    assert rank_players([[7, 9, 7, 1]], [[False, True, False, False]]).tolist() == [[0, 2, 0, 1]]
@@ -0,0 +1,86 @@
+import asyncio
+import json
+from table_server import TableServer, _encode
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.state = {}
+
+    def send(self, message):
+        self.writer.write(_encode(message).encode())
+
+    async def receive(self, kind):
+        """
+        :return: The next message of the given type, keeping track of the state on the way.
+        """
+        while True:
+            message = json.loads(await asyncio.wait_for(self.reader.readline(), 5))
+            if message['type'] == 'state':
+                self.state.update(message)
+            if message['type'] == kind:
+                return message
+
+
+async def _play_invalid_raises(path):
+    server = TableServer(stack=1000, seed=0)
+    listener = await server.start(path=path)
+    clients = []
+    for name in ("Alice", "Bob"):
+        client = Client(*await asyncio.open_unix_connection(path))
+        client.send({'type': 'join', 'name': name})
+        assert (await client.receive('joined'))['seat'] == len(clients)
+        clients.append(client)
+    alice, bob = clients
+    await alice.receive('state')
+    await bob.receive('state')
+    assert alice.state['raise_to'] == [1, 1000]
+
+    alice.send({'type': 'action', 'action': 'raise', 'amount': 40})
+    await alice.receive('state')
+    await bob.receive('state')
+    assert bob.state['turn'] == 1 and bob.state['raise_to'] == [40, 1000]
+
+    # A raise below the bet of the other player would make the pot negative
+    for amount in (1, 39, 1001, 0, "40"):
+        bob.send({'type': 'action', 'action': 'raise', 'amount': amount})
+        assert (await bob.receive('error'))['message'] == "Invalid raise amount"
+    assert server.tables[0].pot == 40
+
+    bob.send({'type': 'action', 'action': 'raise', 'amount': 100})
+    await alice.receive('state')
+    assert alice.state['turn'] == 0 and alice.state['raise_to'] is None
+    # Facing a raise, the first player can only call or fold
+    alice.send({'type': 'action', 'action': 'raise', 'amount': 200})
+    assert (await alice.receive('error'))['message'] == "Invalid raise amount"
+    alice.send({'type': 'action', 'action': 'check_call'})
+    await alice.receive('state')
+    assert alice.state['pot'] == 200 and alice.state['stacks'] == [900, 900]
+
+    for client in clients:
+        client.writer.close()
+    listener.close()
+
+
+def test_invalid_raises_are_rejected(tmp_path):
+    asyncio.run(_play_invalid_raises(str(tmp_path / 'holdem.sock')))
+
+
+async def _join_invalid_tables(path):
+    server = TableServer(seed=0)
+    listener = await server.start(path=path)
+    client = Client(*await asyncio.open_unix_connection(path))
+    for table in ([1], {'id': 1}, "1", 1.5):
+        client.send({'type': 'join', 'name': "Alice", 'table': table})
+        assert (await client.receive('error'))['message'] == "Invalid table"
+    # The connection is still usable
+    client.send({'type': 'join', 'name': "Alice", 'table': 3})
+    assert await client.receive('joined') == {'type': 'joined', 'table': 3, 'seat': 0}
+    client.writer.close()
+    listener.close()
+
+
+def test_invalid_tables_are_rejected(tmp_path):
+    asyncio.run(_join_invalid_tables(str(tmp_path / 'holdem.sock')))
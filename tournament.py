@@ -0,0 +1,349 @@
+"""
+Simulates multi-table tournaments with a blind and ante schedule, to compare tournament structures.
+
+    python tournament.py --events 20000 --players 27 --seats 9 --prizes 0.5,0.3,0.2
+
+Every player follows a push or fold strategy: all in with the best starting hands, a wider range the shorter the
+stack, and call an all in with a tighter range. All tables of a batch of events play their hands together as NumPy
+arrays, and the batches are spread over worker processes.
+"""
+import argparse
+import os
+from functools import lru_cache
+import numpy as np
+from card_lib import PREFLOP_TABLE_PATH, load_preflop_tables, starting_hand_index, starting_hand_combos, \
+    evaluate_batch
+from showdown import settle_pots
+from parallel import map_tasks
+
+
+class BlindLevel:
+    """
+    One level of a blind schedule.
+    """
+    def __init__(self, small_blind, big_blind, ante=0, hands=10):
+        """
+        :param small_blind: The small blind.
+        :param big_blind: The big blind.
+        :param ante: The ante every player at the table posts.
+        :param hands: The number of hands the level lasts, counted per table.
+        """
+        self.small_blind = small_blind
+        self.big_blind = big_blind
+        self.ante = ante
+        self.hands = hands
+
+
+DEFAULT_SCHEDULE = [BlindLevel(10, 20), BlindLevel(15, 30), BlindLevel(25, 50, 5), BlindLevel(50, 100, 10),
+                    BlindLevel(75, 150, 15), BlindLevel(100, 200, 25), BlindLevel(150, 300, 40),
+                    BlindLevel(200, 400, 50), BlindLevel(300, 600, 75), BlindLevel(500, 1000, 100),
+                    BlindLevel(800, 1600, 200), BlindLevel(1000, 2000, 300)]
+
+_hand_percentiles = None
+
+
+def starting_hand_percentiles(samples=2000, seed=0):
+    """
+    Ranks the starting hands by their equity against one random hand, taken from the preflop tables if they have
+    been generated and estimated from samples random deals per starting hand otherwise.
+
+    :param samples: The number of deals per starting hand for the estimate.
+    :param seed: Seed for the estimate, so every process ranks the hands the same way.
+    :return: An array of shape (52, 52) with, for every two hole card codes, the fraction of all starting
+    combinations that are at least as strong.
+    """
+    global _hand_percentiles
+    if _hand_percentiles is not None:
+        return _hand_percentiles
+    if os.path.exists(PREFLOP_TABLE_PATH):
+        equities = np.asarray(load_preflop_tables()[1][0])
+    else:
+        rng = np.random.default_rng(seed)
+        equities = np.empty(169)
+        for hand in range(169):
+            combos = np.array(starting_hand_combos(hand))
+            hero = combos[rng.integers(len(combos), size=samples)]
+            keys = rng.random((samples, 52))
+            np.put_along_axis(keys, hero, 2.0, axis=1)
+            dealt = np.argpartition(keys, 6, axis=1)[:, :7]
+            strength = evaluate_batch(np.hstack([hero, dealt[:, 2:]]))
+            other = evaluate_batch(dealt)
+            equities[hand] = np.mean((strength > other) + 0.5*(strength == other))
+    counts = np.array([len(starting_hand_combos(hand)) for hand in range(169)])
+    order = np.argsort(-equities, kind='stable')
+    percentiles = np.empty(169)
+    percentiles[order] = np.cumsum(counts[order]) / counts.sum()
+    table = np.ones((52, 52))
+    for first in range(52):
+        for second in range(52):
+            if first != second:
+                table[first, second] = percentiles[starting_hand_index((first, second))]
+    _hand_percentiles = table
+    return table
+
+
+@lru_cache(maxsize=None)
+def _icm_tail(stacks, prizes, removed):
+    ev = np.zeros(len(stacks))
+    place = bin(removed).count('1')
+    if place == len(prizes):
+        return ev
+    left = [i for i in range(len(stacks)) if not removed >> i & 1 and stacks[i] > 0]
+    total = sum(stacks[i] for i in left)
+    for i in left:
+        chance = stacks[i] / total
+        ev[i] += chance * prizes[place]
+        ev += chance * _icm_tail(stacks, prizes, removed | 1 << i)
+    return ev
+
+
+def icm_equity(stacks, prizes):
+    """
+    Computes the share of the prize pool every player can expect with the Independent Chip Model (Malmuth-Harville):
+    a player finishes first with a chance proportional to their stack, and the next places follow the same way
+    among the players left. The work grows with the number of subsets of at most len(prizes) players.
+
+    :param stacks: The chip stack of every player.
+    :param prizes: The prize for every paid place, first place first.
+    :return: An array with the expected prize of every player.
+    """
+    return _icm_tail(tuple(float(stack) for stack in stacks), tuple(float(prize) for prize in prizes), 0).copy()
+
+
+class TournamentResult:
+    """
+    The outcome of many simulated events of the same tournament.
+    """
+    def __init__(self, finishes, hands, stacks, prizes):
+        # finishes[i, k] is the number of events where player i finished in place k + 1
+        self.finishes = finishes
+        # The number of hands every event lasted, counted as rounds of all tables
+        self.hands = hands
+        self.events = len(hands)
+        # The probability of every player finishing in every place
+        self.probabilities = finishes / self.events
+        prizes = np.zeros(len(stacks)) if prizes is None else np.asarray(prizes, dtype=np.float64)
+        paid = np.zeros(len(stacks))
+        paid[:len(prizes)] = prizes
+        # The mean and standard deviation of the prize of every player
+        self.expected_prize = self.probabilities @ paid
+        self.prize_std = np.sqrt(np.maximum(self.probabilities @ paid**2 - self.expected_prize**2, 0))
+        # The expected prizes the Independent Chip Model gives the starting stacks
+        self.icm = icm_equity(stacks, prizes) if len(prizes) else np.zeros(len(stacks))
+        self.stacks = np.asarray(stacks)
+
+    def __str__(self):
+        rows = ["{} events, {:.1f} hands on average".format(self.events, self.hands.mean()),
+                "Player    Stack    Prize      Std      ICM  1st place"]
+        for i in range(len(self.stacks)):
+            rows.append("{:6d} {:8d} {:8.4f} {:8.4f} {:8.4f} {:10.4f}".format(
+                i + 1, int(self.stacks[i]), self.expected_prize[i], self.prize_std[i], self.icm[i],
+                self.probabilities[i, 0]))
+        return "\n".join(rows)
+
+
+def _balance(seats, tables, rng):
+    """
+    Breaks the tables an event no longer needs and moves players until no table has two players more than another.
+
+    :param seats: The player at every seat of every table, -1 for empty seats. Changed in place.
+    :param tables: The rows of seats that belong to the event.
+    :param rng: A numpy.random.Generator to pick the players and seats.
+    """
+    size = seats.shape[1]
+    counts = (seats[tables] >= 0).sum(axis=1)
+    needed = -(-counts.sum() // size)
+    while (counts > 0).sum() > needed:
+        broken = np.flatnonzero(counts > 0)[np.argmin(counts[counts > 0])]
+        # A full count keeps the broken table from receiving its own players
+        counts[broken] = size
+        for seat in np.flatnonzero(seats[tables[broken]] >= 0):
+            target = np.argmin(np.where(counts > 0, counts, size + 1))
+            free = np.flatnonzero(seats[tables[target]] < 0)
+            seats[tables[target], rng.choice(free)] = seats[tables[broken], seat]
+            seats[tables[broken], seat] = -1
+            counts[target] += 1
+        counts[broken] = 0
+    while (counts > 0).any() and counts.max() - counts[counts > 0].min() > 1:
+        source = np.argmax(counts)
+        target = np.argmin(np.where(counts > 0, counts, size + 1))
+        seat = rng.choice(np.flatnonzero(seats[tables[source]] >= 0))
+        seats[tables[target], rng.choice(np.flatnonzero(seats[tables[target]] < 0))] = seats[tables[source], seat]
+        seats[tables[source], seat] = -1
+        counts[source] -= 1
+        counts[target] += 1
+
+
+def _simulate_batch(events, stacks, seats_per_table, schedule, push_factor, call_factor, seed):
+    """
+    Plays a batch of events to the end.
+
+    :return: The finish counts of every player as an array of shape (players, players), and the number of hands of
+    every event.
+    """
+    rng = np.random.default_rng(seed)
+    percentiles = starting_hand_percentiles()
+    players = len(stacks)
+    size = seats_per_table
+    per_event = -(-players // size)
+
+    # Players and tables of all events are numbered together, event e owning players e*players to
+    # (e+1)*players - 1 and tables e*per_event to (e+1)*per_event - 1
+    stack = np.tile(np.asarray(stacks, dtype=np.int64), events)
+    place = np.zeros(events*players, dtype=np.int64)
+    pushes = np.tile(np.broadcast_to(np.asarray(push_factor, dtype=np.float64), (players,)), events)
+    calls = np.tile(np.broadcast_to(np.asarray(call_factor, dtype=np.float64), (players,)), events)
+    remaining = np.full(events, players)
+    rounds = np.zeros(events, dtype=np.int64)
+    table_event = np.repeat(np.arange(events), per_event)
+
+    # Random seats, dealt round the tables so they start balanced
+    seats = np.full((events*per_event, size), -1, dtype=np.int64)
+    for event in range(events):
+        order = rng.permutation(players) + event*players
+        k = np.arange(players)
+        seats[event*per_event + k % per_event, k // per_event] = order
+    button = rng.integers(size, size=len(seats))
+
+    level_ends = np.cumsum([level.hands for level in schedule])
+    small_blinds = np.array([level.small_blind for level in schedule], dtype=np.int64)
+    big_blinds = np.array([level.big_blind for level in schedule], dtype=np.int64)
+    antes = np.array([level.ante for level in schedule], dtype=np.int64)
+    never = 4*size
+
+    while (remaining > 1).any():
+        occupied_counts = (seats >= 0).sum(axis=1)
+        live = np.flatnonzero((occupied_counts >= 2) & (remaining[table_event] > 1))
+        occupied = seats[live] >= 0
+        player = np.where(occupied, seats[live], 0)
+        chips = np.where(occupied, stack[player], 0)
+        count = occupied_counts[live]
+        level = np.minimum(np.searchsorted(level_ends, rounds[table_event[live]], side='right'), len(schedule) - 1)
+
+        # Seats in order starting left of the button, occupied seats first
+        relative = (np.arange(size) - button[live, None] - 1) % size
+        order = np.argsort(np.where(occupied, relative, size + relative), axis=1)
+        position = np.empty_like(order)
+        np.put_along_axis(position, order, np.arange(size)[None, :], axis=1)
+        rows = np.arange(len(live))
+        # Heads-up the button posts the small blind
+        heads_up = count == 2
+        small_seat = np.where(heads_up, order[:, 1], order[:, 0])
+        big_seat = np.where(heads_up, order[:, 0], order[:, 1])
+
+        posted = np.minimum(antes[level][:, None], chips) * occupied
+        left = chips - posted
+        small = np.minimum(small_blinds[level], left[rows, small_seat])
+        posted[rows, small_seat] += small
+        big = np.minimum(big_blinds[level], left[rows, big_seat])
+        posted[rows, big_seat] += big
+
+        # Preflop action starts left of the big blind, which acts last
+        action = np.where(occupied, (position - position[rows, big_seat][:, None] - 1) % count[:, None], never)
+        dealt = np.argpartition(rng.random((len(live), 52)), 2*size + 4, axis=1)[:, :2*size + 5]
+        holes = dealt[:, :2*size].reshape(len(live), size, 2)
+        board = dealt[:, 2*size:]
+        strength_rank = percentiles[holes[:, :, 0], holes[:, :, 1]]
+        big_blinds_left = chips / np.maximum(big_blinds[level], 1)[:, None]
+        push = occupied & (strength_rank <= pushes[player] / np.maximum(big_blinds_left, 1e-9))
+        first_push = np.where(push, action, never).min(axis=1)
+        pusher = push & (action == first_push[:, None])
+        callers = occupied & (action > first_push[:, None]) & \
+            (strength_rank <= calls[player] / np.maximum(big_blinds_left, 1e-9))
+        # Players whose blinds or ante took their whole stack are all in without acting
+        all_in = pusher | callers | (occupied & (posted == chips))
+        contributions = np.where(all_in, chips, posted)
+        folded = ~all_in
+        # When everybody folds the big blind takes the blinds and antes
+        walk = first_push == never
+        folded[rows[walk], big_seat[walk]] = False
+
+        hands = np.concatenate([holes, np.broadcast_to(board[:, None, :], (len(live), size, 5))], axis=2)
+        strengths = evaluate_batch(hands.reshape(-1, 7)).reshape(len(live), size)
+        payouts = settle_pots(strengths, contributions, folded | ~occupied, button[live])
+        stack[player[occupied]] += (payouts - contributions)[occupied]
+        button[live] = order[:, 0]
+        rounds[np.unique(table_event[live])] += 1
+
+        busted = occupied & (stack[player] == 0)
+        if busted.any():
+            # Players busting in the same hand are placed by the chips they started the hand with
+            out, out_chips = player[busted], chips[busted]
+            out_event = out // players
+            ranking = np.lexsort((-out_chips, out_event))
+            out, out_event = out[ranking], out_event[ranking]
+            first = np.searchsorted(out_event, out_event)
+            busts = np.bincount(out_event, minlength=events)
+            place[out] = remaining[out_event] - busts[out_event] + 1 + np.arange(len(out)) - first
+            remaining -= busts
+            table_rows = live[np.nonzero(busted)[0]]
+            seats[table_rows, np.nonzero(busted)[1]] = -1
+
+            for event in np.unique(out_event):
+                tables = np.arange(event*per_event, (event + 1)*per_event)
+                if remaining[event] == 1:
+                    winner = seats[tables][seats[tables] >= 0]
+                    place[winner] = 1
+                    seats[tables] = -1
+                else:
+                    _balance(seats, tables, rng)
+
+    finishes = np.zeros((players, players), dtype=np.int64)
+    np.add.at(finishes, (np.arange(events*players) % players, place - 1), 1)
+    return finishes, rounds
+
+
+def simulate_tournaments(events, stacks, seats_per_table=9, schedule=None, prizes=None, push_factor=2.5,
+                         call_factor=1.5, processes=None, seed=None, batch_size=500, executor=None):
+    """
+    Simulates many events of a tournament with push or fold players.
+
+    A player pushes with the starting hands in the best push_factor/b part of all starting hands, where b is the
+    stack in big blinds, and calls an all in with the best call_factor/b part. The events are played in batches of
+    batch_size, every batch with its own random stream spawned from seed, and the batches run in parallel.
+
+    :param events: The number of events to simulate.
+    :param stacks: The starting stack of every player.
+    :param seats_per_table: The number of seats at a table.
+    :param schedule: A list of BlindLevel's, DEFAULT_SCHEDULE if None. The last level lasts until the end.
+    :param prizes: The prize of every paid place, first place first, or None.
+    :param push_factor: The push factor of all players, or an array with one per player.
+    :param call_factor: The call factor of all players, or an array with one per player.
+    :param processes: The number of worker processes, see map_tasks.
+    :param seed: Seed for numpy.random.SeedSequence, None for a fresh random seed.
+    :param batch_size: The number of events per task.
+    :param executor: An executor to run the batches on, see map_tasks.
+    :return: A TournamentResult.
+    """
+    if len(stacks) < 2:
+        raise ValueError("A tournament needs at least two players")
+    if schedule is None:
+        schedule = DEFAULT_SCHEDULE
+    sizes = [batch_size]*(events // batch_size)
+    if events % batch_size:
+        sizes.append(events % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [sizes, [stacks]*len(sizes), [seats_per_table]*len(sizes), [schedule]*len(sizes),
+            [push_factor]*len(sizes), [call_factor]*len(sizes), seeds]
+
+    results = map_tasks(_simulate_batch, args, processes, executor)
+
+    finishes = sum(result[0] for result in results)
+    hands = np.concatenate([result[1] for result in results])
+    return TournamentResult(finishes, hands, stacks, prizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate multi-table push or fold tournaments.")
+    parser.add_argument('--events', type=int, default=10000, help="number of events to simulate")
+    parser.add_argument('--players', type=int, default=18, help="number of players")
+    parser.add_argument('--stack', type=int, default=1500, help="starting stack of every player")
+    parser.add_argument('--seats', type=int, default=9, help="seats per table")
+    parser.add_argument('--prizes', default='0.5,0.3,0.2', help="comma separated prizes, first place first")
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--seed', type=int, default=None, help="seed for reproducible results")
+    args = parser.parse_args()
+
+    prizes = [float(prize) for prize in args.prizes.split(',') if prize]
+    print(simulate_tournaments(args.events, [args.stack]*args.players, args.seats, prizes=prizes,
+                               processes=args.processes, seed=args.seed))